@@ -0,0 +1,103 @@
+"""
+Batch-mode benchmark of MCP_ChatBot.run_batch with a mock LLM against the local openFDA stub.
+
+Writes --queries research queries to a JSONL file, starts the research server over stdio on a
+synthetic store and runs the batch once per concurrency level. Every result line is checked
+(one per query, status ok, an answer and the scripted tool calls) and throughput and latency are
+reported, so the batch runner can be exercised end to end without an API key.
+
+Usage:
+    python benchmarks/bench_batch.py --queries 200 --concurrency 1,8,32 --llm-latency 0.2
+    python benchmarks/bench_batch.py --queries 20 --timeout 0.1 --llm-latency 0.5  # every query times out
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import REPO_ROOT, SERVER_SCRIPT, MockLLM, build_store  # noqa: E402
+from benchmarks.openfda_stub import start_stub  # noqa: E402
+from mcp_chatbot import MCP_ChatBot, load_queries  # noqa: E402
+
+
+def check_results(path: str, expected: int) -> Dict[str, Any]:
+    """Validate a batch output file; returns the number of lines and the problems found."""
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    problems = []
+    if len({record["id"] for record in records}) != expected:
+        problems.append(f"{len(records)} results for {expected} queries")
+    for record in records:
+        if record["status"] != "ok":
+            problems.append(f"{record['id']}: {record['status']} ({record.get('error')})")
+        elif not record["answer"] or record["tool_calls"] != 2 or record["turns"] != 2:
+            problems.append(f"{record['id']}: unexpected result {record['answer']!r}, {record['tool_calls']} tool calls")
+    return {"lines": len(records), "problems": problems}
+
+
+async def bench(args: argparse.Namespace, base_url: str, root: str, queries_path: str, brand_name: str) -> list:
+    chatbot = MCP_ChatBot(anthropic=MockLLM(brand_name, args.llm_latency))
+    env = {
+        **os.environ,
+        "DRUG_DIR": root,
+        "OPENFDA_BASE_URL": base_url,
+        "OPENFDA_RATE_PER_MINUTE": "0",
+        "OPENFDA_DAILY_QUOTA": "0",
+    }
+    config = {"command": sys.executable, "args": [SERVER_SCRIPT], "env": env, "cwd": REPO_ROOT}
+    runs = []
+    try:
+        await asyncio.wait_for(chatbot.connect_to_server("research", config), timeout=60)
+        queries = load_queries(queries_path)
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            out_path = os.path.join(root, f"results-{concurrency}.jsonl")
+            summary = await chatbot.run_batch(queries, out_path, concurrency, args.timeout)
+            check = check_results(out_path, len(queries))
+            runs.append({"concurrency": concurrency, **summary, "problems": check["problems"][:10]})
+            print(f"  concurrency {concurrency:>3}: {summary['queries_per_minute']:8.1f} queries/min  "
+                  f"p50 {summary['latency_p50']:.3f}s  p99 {summary['latency_p99']:.3f}s  "
+                  f"statuses {summary['statuses']}  problems {len(check['problems'])}")
+    finally:
+        await chatbot.cleanup()
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200, help="Queries in the generated batch")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds one query may take")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per mock model response")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per openFDA request (seconds)")
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    server = start_stub(latency=args.latency)
+    try:
+        with tempfile.TemporaryDirectory(prefix="drugs-batch-") as root:
+            brand_names = build_store(root, 100, "sqlite")
+            queries_path = os.path.join(root, "queries.jsonl")
+            with open(queries_path, "w", encoding="utf-8") as f:
+                for i in range(args.queries):
+                    # MockLLM searches for the last word; a few distinct drugs exercise the query cache
+                    f.write(json.dumps({"id": f"q{i}", "query": f"Research the drug batch{i % 20}"}) + "\n")
+            print(f"Running {args.queries} queries (mock LLM latency {args.llm_latency:g}s):")
+            runs = asyncio.run(bench(args, f"http://127.0.0.1:{server.server_port}", root, queries_path, brand_names[-1]))
+    finally:
+        server.shutdown()
+
+    report = {"config": vars(args), "runs": runs}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if any(run["problems"] for run in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
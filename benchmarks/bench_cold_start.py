@@ -0,0 +1,166 @@
+"""
+Cold-start benchmark of the research server: import cost and time to the first tool response.
+
+Every chat session starts its own server process, so startup is paid once per session. This runs
+`python -X importtime` over drugs_research and reports the total and the most expensive imports,
+then starts the server over stdio (as the chatbot does) --runs times per scenario and measures
+spawn -> initialize -> first extract_drug_info response:
+
+- sqlite: the default store
+- json (no snapshot): the folder layout, brand index rebuilt by parsing every category file
+- json (snapshot): the folder layout, brand index loaded from the snapshot the previous run wrote
+
+Usage:
+    python benchmarks/bench_cold_start.py --records 100000 --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import REPO_ROOT, SERVER_SCRIPT, build_store  # noqa: E402
+from drug_store import INDEX_SNAPSHOT  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+
+def import_time_report(root: str, top: int = 15) -> Dict[str, Any]:
+    """
+    Import drugs_research in a fresh interpreter with -X importtime.
+
+    Returns:
+        Dict[str, Any]: Total import milliseconds, the direct imports of drugs_research by cumulative
+        time, and the modules with the largest self time
+    """
+    env = {**os.environ, "DRUG_DIR": root}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import drugs_research"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append({
+            "module": name.strip(),
+            "depth": depth,
+            "self_ms": round(int(self_us) / 1000, 2),
+            "cumulative_ms": round(int(cumulative_us) / 1000, 2),
+        })
+    # A module is listed after everything it imported: the subtree of drugs_research is the run of
+    # nested lines just before it (interpreter startup imports come earlier, at depth 0)
+    end = next(i for i, m in enumerate(modules) if m["module"] == "drugs_research" and m["depth"] == 0)
+    begin = end
+    while begin > 0 and modules[begin - 1]["depth"] > 0:
+        begin -= 1
+    subtree = modules[begin:end + 1]
+    total = modules[end]["cumulative_ms"]
+    direct = sorted((m for m in subtree if m["depth"] == 1), key=lambda m: m["cumulative_ms"], reverse=True)
+    by_self = sorted(subtree, key=lambda m: m["self_ms"], reverse=True)
+    return {
+        "total_ms": total,
+        "top_cumulative": [{k: m[k] for k in ("module", "cumulative_ms")} for m in direct[:top]],
+        "top_self": [{k: m[k] for k in ("module", "self_ms")} for m in by_self[:top]],
+    }
+
+
+async def first_response(root: str, backend: str, brand_name: str) -> Dict[str, float]:
+    """Start a server over stdio and time initialize and the first extract_drug_info call."""
+    env = {**os.environ, "DRUG_DIR": root, "DRUG_STORE": backend}
+    params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], env=env, cwd=REPO_ROOT)
+    start = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            initialized = time.perf_counter() - start
+            result = await session.call_tool("extract_drug_info", {"brand_name": brand_name})
+            first_call = time.perf_counter() - start
+            if result.isError or brand_name not in result.content[0].text:
+                raise RuntimeError(f"Unexpected extract_drug_info result: {result.content}")
+    # Leaving the client terminates the server, which writes the json store's snapshot on exit
+    return {"initialize": initialized, "first_tool_response": first_call, "exit": time.perf_counter() - start}
+
+
+def summarize(name: str, samples: List[Dict[str, float]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"scenario": name, "runs": len(samples)}
+    for key in ("initialize", "first_tool_response", "exit"):
+        values = [sample[key] for sample in samples]
+        summary[f"{key}_p50_ms"] = round(percentile(values, 50) * 1000, 1)
+        summary[f"{key}_max_ms"] = round(max(values) * 1000, 1)
+    return summary
+
+
+async def bench_scenarios(records: int, runs: int) -> List[Dict[str, Any]]:
+    results = []
+    for backend in ("sqlite", "json"):
+        with tempfile.TemporaryDirectory(prefix="drugs-cold-") as root:
+            brand_names = build_store(root, records, backend)
+            # The last brand lives in the last category, so nothing is found early
+            brand_name = brand_names[-1]
+            snapshot = os.path.join(root, INDEX_SNAPSHOT)
+            scenarios = [("sqlite", False)] if backend == "sqlite" else [
+                ("json (no snapshot)", False), ("json (snapshot)", True)
+            ]
+            for name, keep_snapshot in scenarios:
+                samples = []
+                for _ in range(runs):
+                    if not keep_snapshot and os.path.exists(snapshot):
+                        os.remove(snapshot)
+                    samples.append(await first_response(root, backend, brand_name))
+                if keep_snapshot and not os.path.exists(snapshot):
+                    print(f"Warning: {name} ran without a snapshot")
+                summary = summarize(name, samples)
+                print(f"  {name:<20} initialize p50 {summary['initialize_p50_ms']:8.1f} ms  "
+                      f"first tool response p50 {summary['first_tool_response_p50_ms']:8.1f} ms  "
+                      f"max {summary['first_tool_response_max_ms']:8.1f} ms")
+                results.append(summary)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=100000, help="Records in the synthetic stores")
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per scenario")
+    parser.add_argument("--top", type=int, default=15, help="Imports listed in the importtime report")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "benchmarks", "results"),
+                        help="Directory for the JSON report")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="drugs-import-") as root:
+        imports = import_time_report(root, args.top)
+    print(f"Importing drugs_research takes {imports['total_ms']:.0f} ms; largest direct imports:")
+    for module in imports["top_cumulative"]:
+        print(f"  {module['module']:<32} {module['cumulative_ms']:8.1f} ms")
+
+    print(f"\nTime to first tool response ({args.records} records, {args.runs} runs each):")
+    scenarios = asyncio.run(bench_scenarios(args.records, args.runs))
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "out"},
+        "imports": imports,
+        "scenarios": scenarios,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"cold-start-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
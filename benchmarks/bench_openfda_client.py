@@ -0,0 +1,71 @@
+"""
+Compare openFDA request throughput: one-shot `requests.get` per call vs the pooled async client.
+
+Usage:
+    python benchmarks/bench_openfda_client.py --calls 200 --concurrency 16 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.openfda_stub import start_stub  # noqa: E402
+from openfda_client import OpenFDAClient  # noqa: E402
+
+
+def _path(i: int) -> str:
+    name = f"drug{i}"
+    return f"/drug/label.json?search=openfda.brand_name:{name}+openfda.substance_name:{name}&limit=5"
+
+
+def bench_requests(base_url: str, calls: int) -> float:
+    """Old behaviour: a fresh requests.get (new connection) per call, one call at a time."""
+    start = time.perf_counter()
+    for i in range(calls):
+        response = requests.get(base_url + _path(i))
+        response.json()
+    return calls / (time.perf_counter() - start)
+
+
+async def bench_async(base_url: str, calls: int, concurrency: int) -> float:
+    """New behaviour: concurrent calls sharing one keep-alive pool."""
+    client = OpenFDAClient(
+        base_url=base_url,
+        concurrency=concurrency,
+        max_connections=concurrency,
+        rate_per_minute=0,
+        daily_quota=0,
+    )
+    start = time.perf_counter()
+    await asyncio.gather(*(client.get_json(_path(i)) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per request (seconds)")
+    args = parser.parse_args()
+
+    server = start_stub(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        before = bench_requests(base_url, args.calls)
+        after = asyncio.run(bench_async(base_url, args.calls, args.concurrency))
+    finally:
+        server.shutdown()
+
+    print(f"requests.get per call : {before:8.1f} calls/sec")
+    print(f"pooled async client   : {after:8.1f} calls/sec ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+End-to-end benchmark of the research server and the chatbot loop against a local openFDA stub.
+
+For each store size a synthetic drug store is generated, the server is started over a real stdio
+MCP session (the same way the chatbot starts it) and every operation is called repeatedly:
+search_drug_info (cache miss and hit), extract_drug_info, both drugs:// resources and
+MCP_ChatBot.process_query with a mock LLM that requests two tools and then answers. p50/p99
+latency, throughput and peak memory are written to a JSON file so runs can be compared.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 10,1000,100000 --latency 0.02 --rate-limit-every 50
+    python benchmarks/bench_suite.py --sizes 1000 --compare benchmarks/results/bench-<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.openfda_stub import make_label, start_stub  # noqa: E402
+from bulk_import import peak_rss_mb  # noqa: E402
+from drug_store import extract_record, open_store  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_ROOT, "drugs_research.py")
+# Records per synthetic category
+CATEGORY_SIZE = 100
+
+
+def build_store(root: str, records: int, backend: str) -> List[str]:
+    """
+    Write a synthetic store of `records` labels, CATEGORY_SIZE per category.
+
+    Returns:
+        List[str]: The saved brand names, for extract_drug_info lookups
+    """
+    store = open_store(root, backend)
+    brand_names = []
+    try:
+        for start in range(0, records, CATEGORY_SIZE):
+            category = f"substance{start // CATEGORY_SIZE}"
+            batch = {}
+            for i in range(start, min(start + CATEGORY_SIZE, records)):
+                info = extract_record(make_label(category, i))
+                batch[info["brand_name"]] = info
+            store.save_category(category, batch)
+            brand_names.extend(batch)
+    finally:
+        store.close()
+    return brand_names
+
+
+async def measure(
+    name: str, calls: int, concurrency: int, call: Callable[[int], Awaitable[Any]]
+) -> Dict[str, Any]:
+    """Run call(0..calls-1) with up to `concurrency` in flight and summarize the latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await call(i)
+                if getattr(result, "isError", False):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "operation": name,
+        "calls": calls,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "throughput_per_sec": round(calls / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+class MockLLM:
+    """
+    Stand-in for AsyncAnthropic that scripts a two-turn tool loop without network calls.
+
+    The first turn streams a tool_use block for search_drug_info and one for extract_drug_info;
+    once tool results are in the conversation it streams a short text answer.
+
+    Args:
+        brand_name (str): Brand the scripted extract_drug_info call looks up
+        latency (float): Seconds each simulated model response takes
+    """
+
+    def __init__(self, brand_name: str, latency: float = 0.0):
+        self.messages = self
+        self.brand_name = brand_name
+        self.latency = latency
+
+    def stream(self, **request):
+        messages = request["messages"]
+        if len(messages) == 1:
+            drug = messages[0]["content"][-1]["text"].split()[-1]
+            content = [
+                SimpleNamespace(type="tool_use", id="call_1", name="search_drug_info",
+                                input={"drug_name": drug, "max_results": 5}),
+                SimpleNamespace(type="tool_use", id="call_2", name="extract_drug_info",
+                                input={"brand_name": self.brand_name}),
+            ]
+        else:
+            content = [SimpleNamespace(type="text", text="Summary of the requested drug.")]
+        return _MockStream(content, self.latency)
+
+
+class _MockStream:
+    def __init__(self, content: list, latency: float):
+        self.content = content
+        self.latency = latency
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.latency)
+        for block in self.content:
+            if block.type == "text":
+                yield SimpleNamespace(type="text", text=block.text)
+            yield SimpleNamespace(type="content_block_stop", content_block=block)
+
+    async def get_final_message(self):
+        usage = SimpleNamespace(input_tokens=0, output_tokens=0,
+                                cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        return SimpleNamespace(content=self.content, usage=usage)
+
+
+def _child_peak_rss_mb() -> float:
+    """Largest peak RSS (VmHWM) of this process's children in MB; Linux only, else 0."""
+    peak = 0.0
+    try:
+        children = []
+        for task in os.listdir(f"/proc/{os.getpid()}/task"):
+            with open(f"/proc/{os.getpid()}/task/{task}/children") as f:
+                children.extend(f.read().split())
+        for pid in children:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]) / 1024)
+    except OSError:
+        pass
+    return peak
+
+
+async def bench_size(size: int, args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    """Benchmark every operation against a fresh store of `size` records."""
+    from mcp_chatbot import MCP_ChatBot
+
+    with tempfile.TemporaryDirectory(prefix="drugs-bench-") as root:
+        start = time.perf_counter()
+        brand_names = build_store(root, size, args.backend)
+        build_seconds = time.perf_counter() - start
+        print(f"[{size} records] store built in {build_seconds:.1f}s")
+
+        chatbot = MCP_ChatBot(anthropic=MockLLM(brand_names[-1], args.llm_latency))
+        env = {
+            **os.environ,
+            "DRUG_DIR": root,
+            "DRUG_STORE": args.backend,
+            "OPENFDA_BASE_URL": base_url,
+            "OPENFDA_RATE_PER_MINUTE": "0",
+            "OPENFDA_DAILY_QUOTA": "0",
+        }
+        config = {"command": sys.executable, "args": [SERVER_SCRIPT], "env": env, "cwd": REPO_ROOT}
+        try:
+            startup = await asyncio.wait_for(chatbot.connect_to_server("research", config), timeout=60)
+            session = chatbot.sessions["search_drug_info"]
+            calls, concurrency = args.calls, args.concurrency
+            categories = max(1, -(-size // CATEGORY_SIZE))
+
+            results = [
+                await measure("search_drug_info (miss)", calls, concurrency, lambda i: session.call_tool(
+                    "search_drug_info", {"drug_name": f"bench{size}x{i}"})),
+                await measure("search_drug_info (hit)", calls, concurrency, lambda i: session.call_tool(
+                    "search_drug_info", {"drug_name": f"bench{size}x{i % 5}"})),
+                await measure("extract_drug_info", calls, concurrency, lambda i: session.call_tool(
+                    "extract_drug_info", {"brand_name": brand_names[(i * 7919) % len(brand_names)]})),
+                await measure("drugs://categories", calls, concurrency, lambda i: session.read_resource(
+                    "drugs://categories")),
+                await measure("drugs://{category}", calls, concurrency, lambda i: session.read_resource(
+                    f"drugs://substance{i % categories}")),
+            ]
+            # Collect the streamed answers instead of printing them; keeps the report readable
+            results.append(await measure("process_query (mock LLM)", args.chat_calls, concurrency,
+                                         lambda i: chatbot.process_query(f"Research the drug chat{i % 5}",
+                                                                         on_text=lambda text: None)))
+            server_peak = _child_peak_rss_mb()
+        finally:
+            await chatbot.cleanup()
+
+    for result in results:
+        print(f"  {result['operation']:<26} p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+              f"{result['throughput_per_sec']:8.1f}/s  errors {result['errors']}")
+    return {
+        "records": size,
+        "store_build_seconds": round(build_seconds, 2),
+        "server_startup_seconds": round(startup, 3),
+        "server_peak_rss_mb": round(server_peak, 1),
+        "results": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline_path: str) -> None:
+    """Print p50/p99/throughput changes against an earlier report."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {
+        (run["records"], result["operation"]): result
+        for run in baseline.get("runs", []) for result in run["results"]
+    }
+    print(f"\nChange vs {baseline_path}:")
+    for run in report["runs"]:
+        for result in run["results"]:
+            old = before.get((run["records"], result["operation"]))
+            if not old:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p99_ms", "throughput_per_sec"):
+                change = (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                deltas.append(f"{key} {change:+6.1f}%")
+            print(f"  [{run['records']}] {result['operation']:<26} " + "  ".join(deltas))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10,1000,100000", help="Comma-separated store sizes (records)")
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "json"))
+    parser.add_argument("--calls", type=int, default=200, help="Calls per server operation")
+    parser.add_argument("--chat-calls", type=int, default=50, help="process_query runs per store size")
+    parser.add_argument("--concurrency", type=int, default=1, help="Calls in flight at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per request (seconds)")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Stub answers every Nth request with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per mock model response")
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "benchmarks", "results"),
+                        help="Directory for the JSON report")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    server = start_stub(latency=args.latency, rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        runs = [asyncio.run(bench_size(int(size), args, base_url)) for size in args.sizes.split(",")]
+    finally:
+        server.shutdown()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "bench_peak_rss_mb": round(peak_rss_mb(), 1),
+        "runs": runs,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {path}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Load-test the research server's streamable-HTTP mode with many concurrent MCP clients.
+
+Starts `drugs_research.py serve --transport streamable-http` against the local openFDA stub (or
+targets an already running server with --url) and runs --clients sessions at once. Each client
+repeats a mix of search_drug_info over a small shared set of drugs (so clients benefit from each
+other's warm cache), extract_drug_info and a drugs://categories read. All clients share one
+process; to push harder than one core of client-side work allows, run several instances with --url.
+
+Usage:
+    python benchmarks/load_http.py --clients 32 --requests 50 --workers 1
+    python benchmarks/load_http.py --clients 64 --requests 50 --workers 4
+    python benchmarks/load_http.py --url http://127.0.0.1:8000/mcp --clients 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import REPO_ROOT, SERVER_SCRIPT  # noqa: E402
+from benchmarks.openfda_stub import start_stub  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+DRUGS = ["ibuprofen", "naproxen", "aspirin", "acetaminophen", "metformin", "insulin", "lisinopril", "atorvastatin"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server did not listen on port {port} within {timeout:g}s")
+            await asyncio.sleep(0.1)
+
+
+async def run_client(url: str, client_id: int, requests: int, latencies: Dict[str, List[float]]) -> int:
+    """Run one session's request mix; returns the number of failed calls."""
+    errors = 0
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for i in range(requests):
+                drug = DRUGS[(client_id + i) % len(DRUGS)]
+                calls = {
+                    "search_drug_info": lambda: session.call_tool("search_drug_info", {"drug_name": drug}),
+                    "extract_drug_info": lambda: session.call_tool("extract_drug_info", {"brand_name": f"{drug.title()} Brand 0"}),
+                    "drugs://categories": lambda: session.read_resource("drugs://categories"),
+                }
+                for name, call in calls.items():
+                    start = time.perf_counter()
+                    try:
+                        result = await call()
+                        errors += bool(getattr(result, "isError", False))
+                    except Exception:
+                        errors += 1
+                    latencies.setdefault(name, []).append(time.perf_counter() - start)
+    return errors
+
+
+async def load(url: str, clients: int, requests: int) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {}
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_client(url, i, requests, latencies) for i in range(clients)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    failed_clients = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    for failure in failed_clients[:3]:
+        print(f"Client failed: {failure!r}")
+    total_calls = sum(len(values) for values in latencies.values())
+    return {
+        "clients": clients,
+        "failed_clients": len(failed_clients),
+        "errors": sum(outcome for outcome in outcomes if isinstance(outcome, int)),
+        "calls": total_calls,
+        "seconds": round(elapsed, 2),
+        "throughput_per_sec": round(total_calls / elapsed, 1) if elapsed else 0.0,
+        "operations": {
+            name: {
+                "calls": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Existing server endpoint (default: start one on a free port)")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent MCP sessions")
+    parser.add_argument("--requests", type=int, default=50, help="Request mixes per client")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes of the started server")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per openFDA request (seconds)")
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    server = process = None
+    url = args.url
+    with tempfile.TemporaryDirectory(prefix="drugs-load-") as root:
+        try:
+            if not url:
+                server = start_stub(latency=args.latency)
+                port = _free_port()
+                env = {
+                    **os.environ,
+                    "DRUG_DIR": root,
+                    "OPENFDA_BASE_URL": f"http://127.0.0.1:{server.server_port}",
+                    "OPENFDA_RATE_PER_MINUTE": "0",
+                    "OPENFDA_DAILY_QUOTA": "0",
+                }
+                process = subprocess.Popen(
+                    [sys.executable, SERVER_SCRIPT, "serve", "--transport", "streamable-http",
+                     "--port", str(port), "--workers", str(args.workers)],
+                    env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                asyncio.run(_wait_for_port(port))
+                url = f"http://127.0.0.1:{port}/mcp"
+            report = asyncio.run(load(url, args.clients, args.requests))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+            if server is not None:
+                server.shutdown()
+
+    report = {"url": url, "workers": args.workers if not args.url else None, **report}
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
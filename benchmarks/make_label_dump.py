@@ -0,0 +1,50 @@
+"""
+Write synthetic openFDA bulk label partitions (drug-label-000N-of-000M.json.zip) for trying
+`drugs-research import-dump` without downloading the real dataset.
+
+Usage:
+    python benchmarks/make_label_dump.py --out /tmp/label-dump --partitions 4 --labels 20000
+"""
+import argparse
+import json
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.openfda_stub import make_label  # noqa: E402
+
+SUBSTANCES = ["ibuprofen", "acetaminophen", "naproxen", "aspirin", "insulin", "metformin", "lisinopril"]
+
+
+def write_partition(path: str, labels: int, offset: int) -> None:
+    """Write one partition, streaming the results array so memory stays flat."""
+    member = os.path.basename(path)[: -len(".zip")]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(member, "w") as raw:
+            meta = {"disclaimer": "synthetic", "results": {"skip": 0, "limit": labels, "total": labels}}
+            raw.write(('{"meta": %s, "results": [' % json.dumps(meta)).encode("utf-8"))
+            for i in range(offset, offset + labels):
+                if i > offset:
+                    raw.write(b",\n")
+                raw.write(json.dumps(make_label(SUBSTANCES[i % len(SUBSTANCES)], i)).encode("utf-8"))
+            raw.write(b"]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--out", required=True, help="Directory to write the partitions to")
+    parser.add_argument("--partitions", type=int, default=2)
+    parser.add_argument("--labels", type=int, default=1000, help="Labels per partition")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for n in range(1, args.partitions + 1):
+        path = os.path.join(args.out, f"drug-label-{n:04d}-of-{args.partitions:04d}.json.zip")
+        write_partition(path, args.labels, (n - 1) * args.labels)
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Local stand-in for api.fda.gov used by the benchmarks.
+
+Serves /drug/label.json with synthetic label records after a configurable delay, so the openFDA
+client can be measured without network noise or quota usage. Every Nth request can be answered
+with a 429 (with Retry-After) or a 503 to exercise rate limiting and retries.
+
+Usage:
+    python benchmarks/openfda_stub.py --port 8765 --latency 0.05 --rate-limit-every 20
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_label(name: str, i: int) -> dict:
+    """Build one synthetic openFDA label record for `name`."""
+    return {
+        "openfda": {
+            "brand_name": [f"{name.title()} Brand {i}"],
+            "generic_name": [name.upper()],
+            "substance_name": [name.upper()],
+            "manufacturer_name": [f"Manufacturer {i % 7}"],
+            "route": ["ORAL" if i % 2 == 0 else "TOPICAL"],
+        },
+        "purpose": [f"Purpose of {name} {i}"],
+        "indications_and_usage": [f"Use {name} as directed. " * 5],
+        "warnings": [f"Do not exceed the recommended dose of {name}. Keep out of reach of children."],
+        "adverse_reactions": ["Nausea. Headache."],
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when many pooled connections open at once
+    request_queue_size = 256
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, the body waits for a delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+    latency = 0.0
+    rate_limit_every = 0
+    error_every = 0
+    retry_after = 1
+    total = 0
+    counter = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        n = next(self.counter)
+        if self.rate_limit_every and n % self.rate_limit_every == 0:
+            self._send(429, {"error": {"code": "OVER_RATE_LIMIT"}}, {"Retry-After": str(self.retry_after)})
+            return
+        if self.error_every and n % self.error_every == 0:
+            self._send(503, {"error": {"code": "SERVICE_UNAVAILABLE"}})
+            return
+        parsed = urlparse(self.path)
+        if parsed.path != "/drug/label.json":
+            self._send(404, {"error": {"code": "NOT_FOUND"}})
+            return
+        query = parse_qs(parsed.query)
+        search = query.get("search", [""])[0]
+        limit = int(query.get("limit", ["1"])[0])
+        if "search_after" in query:
+            # search_after is emulated as an offset so deep pages behave like skip; unlike skip it
+            # has no upper bound
+            skip = int(query["search_after"][0])
+        else:
+            skip = int(query.get("skip", ["0"])[0])
+            if skip > 25000:
+                self._send(400, {"error": {"code": "BAD_REQUEST", "message": "Skip value must be 25000 or less."}})
+                return
+        # 'openfda.brand_name:ibuprofen openfda.substance_name:ibuprofen' -> ['ibuprofen']
+        names = list(dict.fromkeys(clause.split(":", 1)[-1].strip('"') for clause in search.split(" ") if clause))
+        names = names or ["unknown"]
+        total = self.total or limit
+        results = [make_label(names[i % len(names)], i) for i in range(skip, min(skip + limit, total))]
+        headers = {}
+        if skip + limit < total:
+            next_url = f"http://{self.headers['Host']}{parsed.path}?search={search}&limit={limit}&search_after={skip + limit}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        self._send(200, {"meta": {"results": {"skip": skip, "limit": limit, "total": total}}, "results": results}, headers)
+
+
+def start_stub(
+    port: int = 0,
+    latency: float = 0.0,
+    rate_limit_every: int = 0,
+    error_every: int = 0,
+    retry_after: float = 1,
+    total: int = 0,
+) -> StubServer:
+    """Start the stub in a daemon thread and return the server (its port is server.server_port)."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency,
+        "rate_limit_every": rate_limit_every,
+        "error_every": error_every,
+        "retry_after": retry_after,
+        "total": total,
+        "counter": itertools.count(1),
+    })
+    server = StubServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--error-every", type=int, default=0, help="Answer every Nth request with 503")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--total", type=int, default=0, help="Matches per search for paging (default: the limit)")
+    args = parser.parse_args()
+    server = start_stub(args.port, args.latency, args.rate_limit_every, args.error_every, args.retry_after, args.total)
+    print(f"openFDA stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,222 @@
+"""
+Offline import of the openFDA drug label bulk download.
+
+openFDA publishes the label dataset as zipped JSON partitions (drug-label-0001-of-00NN.json.zip),
+each a single {"meta": ..., "results": [...]} document of several hundred MB. Partitions are parsed
+incrementally, one label at a time, and written to the SQLite drug store in batches, with one worker
+process per partition.
+"""
+import io
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from drug_store import SQLiteStore, category_for, extract_record
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Characters read from a partition at a time
+CHUNK_SIZE = 1 << 20
+# Longest label (in characters) buffered while looking for its end; a label still undecodable past
+# this is treated as malformed instead of pulling the rest of the partition into memory
+MAX_LABEL_CHARS = 8 * CHUNK_SIZE
+# Labels between progress lines printed by each worker
+PROGRESS_EVERY = 10000
+
+_RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+
+
+def iter_results(stream: TextIO, chunk_size: int = CHUNK_SIZE, max_label_chars: int = MAX_LABEL_CHARS) -> Iterator[dict]:
+    """
+    Yield the elements of the top-level "results" array of an openFDA JSON document.
+
+    Only the current chunk plus the label being decoded are kept in memory, so a partition is
+    never materialized as a whole.
+
+    Args:
+        stream (TextIO): Text stream of the JSON document
+        chunk_size (int): Characters to read at a time
+        max_label_chars (int): Longest label to buffer
+
+    Raises:
+        ValueError: If the document has no "results" array, ends in the middle of it or holds a
+            label that cannot be decoded within max_label_chars; the message gives the label's
+            character offset
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    # Characters read so far; the buffer is always the tail of what was read
+    read = 0
+    # "meta" also holds a "results" key, but its value is an object, not an array
+    while True:
+        match = _RESULTS_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            raise ValueError('No "results" array found')
+        read += len(chunk)
+        # Keep a tail in case the key is split across chunks
+        buffer = buffer[-64:] + chunk
+
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            entry, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            offset = read - len(buffer) + pos
+            if eof:
+                raise ValueError(f'Document ended inside the "results" array (label at offset {offset})')
+            if len(buffer) - pos > max_label_chars:
+                raise ValueError(f"Malformed label at offset {offset}: not decodable within {max_label_chars} characters")
+            chunk = stream.read(chunk_size)
+            read += len(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield entry
+
+
+def iter_zip_labels(zip_path: str) -> Iterator[dict]:
+    """Yield every label of every .json member of an openFDA bulk download zip."""
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.namelist():
+            if not member.endswith(".json"):
+                continue
+            with archive.open(member) as raw:
+                yield from iter_results(io.TextIOWrapper(raw, encoding="utf-8"))
+
+
+def label_category(entry: dict) -> Optional[str]:
+    """
+    Category a dump label is saved under: its first substance (or generic, or brand) name.
+
+    Returns:
+        Optional[str]: The category, or None if the label names none of them
+    """
+    openfda_data = entry.get("openfda", {})
+    for field in ("substance_name", "generic_name", "brand_name"):
+        values = openfda_data.get(field)
+        if values:
+            return category_for(values[0])
+    return None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (0 where it cannot be measured)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def import_partition(zip_path: str, db_path: str, batch_size: int = 500) -> Tuple[str, int, int, float, float]:
+    """
+    Import one partition into the SQLite store at db_path. Runs in a worker process.
+
+    Records are keyed by brand name within their category, so labels without a brand name or a
+    category (e.g. no openfda section at all) are skipped instead of overwriting each other as
+    "Unknown".
+
+    Returns:
+        Tuple[str, int, int, float, float]: Partition path, labels imported, labels skipped,
+        seconds taken and the worker's peak RSS in MB
+    """
+    start = time.perf_counter()
+    store = SQLiteStore(db_path)
+    pending: Dict[str, Dict[str, dict]] = {}
+    pending_count = 0
+    rows = 0
+    skipped = 0
+
+    def flush():
+        # One transaction per batch, however many categories its labels fall into
+        if pending:
+            store.add_categories(pending)
+        pending.clear()
+
+    try:
+        for entry in iter_zip_labels(zip_path):
+            category = label_category(entry)
+            if category is None or not entry.get("openfda", {}).get("brand_name"):
+                skipped += 1
+                continue
+            info = extract_record(entry)
+            pending.setdefault(category, {})[info["brand_name"]] = info
+            pending_count += 1
+            rows += 1
+            if pending_count >= batch_size:
+                flush()
+                pending_count = 0
+            if rows % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {os.path.basename(zip_path)}: {rows} labels ({rows / elapsed:.0f} rows/sec)", flush=True)
+        flush()
+    finally:
+        store.close()
+    return zip_path, rows, skipped, time.perf_counter() - start, peak_rss_mb()
+
+
+def import_dump(zip_paths: List[str], db_path: str, workers: int = 0, batch_size: int = 500) -> Dict[str, float]:
+    """
+    Import openFDA bulk label partitions into the SQLite store, one worker process per partition.
+
+    Args:
+        zip_paths (List[str]): Partition zip files
+        db_path (str): SQLite drug store path
+        workers (int): Worker processes (default: one per partition, up to the CPU count)
+        batch_size (int): Labels written per transaction
+
+    Returns:
+        Dict[str, float]: Labels imported and skipped, elapsed seconds, rows/sec and peak RSS (MB)
+        of the largest worker and of this process
+    """
+    # Create the schema once before the workers race to open the database
+    SQLiteStore(db_path).close()
+    workers = workers or min(len(zip_paths), os.cpu_count() or 1)
+    start = time.perf_counter()
+    total_rows = 0
+    total_skipped = 0
+    worker_peak = 0.0
+
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(import_partition, path, db_path, batch_size) for path in zip_paths]
+        for done, future in enumerate(as_completed(futures), start=1):
+            path, rows, skipped, seconds, peak = future.result()
+            total_rows += rows
+            total_skipped += skipped
+            worker_peak = max(worker_peak, peak)
+            elapsed = time.perf_counter() - start
+            print(
+                f"[{done}/{len(zip_paths)}] {os.path.basename(path)}: {rows} labels ({skipped} skipped) in {seconds:.1f}s "
+                f"({rows / seconds if seconds else 0:.0f} rows/sec, peak RSS {peak:.0f} MB) "
+                f"- {total_rows} total, {total_rows / elapsed if elapsed else 0:.0f} rows/sec overall"
+            )
+
+    elapsed = time.perf_counter() - start
+    return {
+        "labels": total_rows,
+        "skipped": total_skipped,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(total_rows / elapsed, 1) if elapsed else 0.0,
+        "worker_peak_rss_mb": round(worker_peak, 1),
+        "main_peak_rss_mb": round(peak_rss_mb(), 1),
+    }
@@ -0,0 +1,943 @@
+import json
+import marshal
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+# Fields kept for every drug record, in the order they are written
+RECORD_FIELDS = (
+    "brand_name",
+    "substance_name",
+    "manufacturer",
+    "route",
+    "purpose",
+    "usage",
+    "warnings",
+    "adverse_reactions",
+    "boxed_warning",
+)
+
+# Free-text label fields that search_text can query
+TEXT_FIELDS = ("purpose", "usage", "warnings", "adverse_reactions", "boxed_warning")
+# Most records one search_text call returns
+MAX_SEARCH_RESULTS = 100
+
+DRUG_FILE = "drug_info.json"
+QUERY_FILE = "query_cache.json"
+DB_FILE = "drugs.db"
+# Bulk ingest checkpoints of the folder layout live in <root>/.ingest/<job>.json
+CHECKPOINT_DIR = ".ingest"
+# Brand index snapshot of the folder layout, so a new server process does not re-parse every file
+INDEX_SNAPSHOT = ".brand_index.snapshot"
+SNAPSHOT_VERSION = 1
+# The snapshot starts with the size of its header: the lookup tables in marshal format (fast to
+# load and, unlike pickle, unable to run code). The JSON-encoded records follow it.
+_SNAPSHOT_PREFIX = struct.Struct("<Q")
+# The process umask, read once: os.umask can only be read by setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_bytes_atomic(path: str, chunks: Iterable[bytes]) -> None:
+    """
+    Replace `path` with the concatenated chunks so readers see either the old or the new file,
+    never a partial one: the data goes to a temp file in the same directory, is fsynced and
+    renamed over `path`. The file keeps the mode of the one it replaces; a new file gets the
+    default mode for the umask (mkstemp alone would leave it readable by the owner only).
+    """
+    directory = os.path.dirname(path) or "."
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(os, "fchmod"):  # not on Windows
+                os.fchmod(f.fileno(), mode)
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # Persist the rename itself (not possible on Windows, where directories cannot be opened)
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs: Any) -> None:
+    """Replace `path` with `data` as JSON, atomically (see write_bytes_atomic)."""
+    write_bytes_atomic(path, [json.dumps(data, **dump_kwargs).encode("utf-8")])
+
+
+def normalize_drug_name(name: str) -> str:
+    """
+    Normalize a drug name for case-insensitive matching.
+
+    openFDA returns brand names in mixed case ("Advil", "ADVIL", "Advil Liqui-Gels"),
+    so names are case-folded and punctuation/whitespace runs are collapsed to a single space.
+    """
+    return " ".join(re.sub(r"[^\w]+", " ", name.casefold()).split())
+
+
+class _SnapshotRecords(Mapping):
+    """
+    The records of one category as stored in an index snapshot.
+
+    Only brand names, normalized keys and byte ranges are held in memory; a record is decoded from
+    the memory-mapped snapshot when it is looked up.
+    """
+
+    def __init__(self, buffer: mmap.mmap, body: int, entries: Dict[str, List]):
+        self._buffer = buffer
+        self._body = body
+        # brand_name -> [normalized key, offset in the body, length]
+        self._entries = entries
+
+    def __getitem__(self, brand_name: str) -> dict:
+        _, offset, length = self._entries[brand_name]
+        start = self._body + offset
+        return json.loads(self._buffer[start:start + length])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def normalized_key(self, brand_name: str) -> str:
+        return self._entries[brand_name][0]
+
+
+class BrandIndex:
+    """
+    In-memory brand_name -> (category, record) index over the drug_info.json files in a drug directory.
+
+    The index is built lazily on first lookup and refreshed per category: a category file is only
+    re-parsed when its mtime changes, and `search_drug_info` pushes freshly written data in directly.
+
+    With a snapshot path, the first build starts from the snapshot a previous process wrote: it is
+    memory-mapped, categories whose file mtime still matches are indexed without reading their
+    files, and only the rest are re-parsed. `write_snapshot` saves the current index.
+    """
+
+    def __init__(self, root: str, snapshot_path: Optional[str] = None):
+        self.root = root
+        self.snapshot_path = snapshot_path
+        self._lock = threading.RLock()
+        self._built = False
+        # Whether the index changed since it was loaded from or written to the snapshot
+        self._dirty = False
+        self._snapshot: Optional[mmap.mmap] = None
+        # category -> mtime_ns of its drug_info.json when it was loaded
+        self._mtimes: Dict[str, int] = {}
+        # category -> {brand_name: record}
+        self._categories: Dict[str, Dict[str, dict]] = {}
+        # brand_name -> categories containing it (in load order)
+        self._exact: Dict[str, List[str]] = {}
+        # normalized brand_name -> [(category, brand_name), ...]
+        self._normalized: Dict[str, List[Tuple[str, str]]] = {}
+
+    def _file_path(self, category: str) -> str:
+        return os.path.join(self.root, category, DRUG_FILE)
+
+    @staticmethod
+    def _key_function(data: Mapping) -> Callable[[str], str]:
+        # Snapshot records carry their normalized keys
+        return getattr(data, "normalized_key", normalize_drug_name)
+
+    def _unindex(self, category: str) -> None:
+        data = self._categories.pop(category, {})
+        key_of = self._key_function(data)
+        for brand_name in data:
+            owners = self._exact.get(brand_name, [])
+            if category in owners:
+                owners.remove(category)
+            if not owners:
+                self._exact.pop(brand_name, None)
+            key = key_of(brand_name)
+            entries = [e for e in self._normalized.get(key, []) if e[0] != category]
+            if entries:
+                self._normalized[key] = entries
+            else:
+                self._normalized.pop(key, None)
+        self._mtimes.pop(category, None)
+
+    def _index(self, category: str, data: Mapping[str, dict], mtime_ns: int) -> None:
+        self._unindex(category)
+        self._categories[category] = data
+        self._mtimes[category] = mtime_ns
+        key_of = self._key_function(data)
+        for brand_name in data:
+            self._exact.setdefault(brand_name, []).append(category)
+            self._normalized.setdefault(key_of(brand_name), []).append((category, brand_name))
+        if not isinstance(data, _SnapshotRecords):
+            self._dirty = True
+
+    def _load_snapshot(self) -> None:
+        """
+        Take over the index saved in the snapshot; refresh() then re-parses the categories that
+        changed since. The lookup tables are stored ready-made, so loading is a single marshal.loads.
+        """
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Missing or empty snapshot
+            return
+        try:
+            (header_size,) = _SNAPSHOT_PREFIX.unpack_from(buffer, 0)
+            body = _SNAPSHOT_PREFIX.size + header_size
+            header = marshal.loads(buffer[_SNAPSHOT_PREFIX.size:body])
+            if header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported version {header.get('version')}")
+        except (ValueError, EOFError, TypeError, struct.error) as e:
+            print(f"Ignoring index snapshot {self.snapshot_path}: {str(e)}", file=sys.stderr)
+            buffer.close()
+            return
+        self._categories = {
+            category: _SnapshotRecords(buffer, body, entries)
+            for category, entries in header["entries"].items()
+        }
+        self._mtimes = header["mtimes"]
+        self._exact = header["exact"]
+        self._normalized = header["normalized"]
+        self._snapshot = buffer
+
+    def write_snapshot(self) -> bool:
+        """
+        Save the index for the next process, if it changed since it was loaded or last saved.
+
+        Returns:
+            bool: Whether a snapshot was written
+        """
+        with self._lock:
+            if not self.snapshot_path or not self._built or not self._dirty:
+                return False
+            entries: Dict[str, Dict[str, List]] = {}
+            records: List[bytes] = []
+            offset = 0
+            for category, data in self._categories.items():
+                key_of = self._key_function(data)
+                entries[category] = {}
+                for brand_name in data:
+                    encoded = json.dumps(data[brand_name], ensure_ascii=False).encode("utf-8")
+                    entries[category][brand_name] = [key_of(brand_name), offset, len(encoded)]
+                    records.append(encoded)
+                    offset += len(encoded)
+            header = {
+                "version": SNAPSHOT_VERSION,
+                "mtimes": self._mtimes,
+                "entries": entries,
+                "exact": self._exact,
+                "normalized": self._normalized,
+            }
+            head = marshal.dumps(header)
+            write_bytes_atomic(self.snapshot_path, [_SNAPSHOT_PREFIX.pack(len(head)), head, *records])
+            self._dirty = False
+            return True
+
+    def _load(self, category: str, mtime_ns: int) -> None:
+        file_path = self._file_path(category)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"Error reading {file_path}: {str(e)}", file=sys.stderr)
+            self._unindex(category)
+            return
+        self._index(category, data, mtime_ns)
+
+    def _stat(self, category: str) -> Optional[int]:
+        try:
+            return os.stat(self._file_path(category)).st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh(self) -> None:
+        """Rescan the drug directory and reload only the category files that were added, changed or removed."""
+        with self._lock:
+            if not self._built and self.snapshot_path:
+                self._load_snapshot()
+            seen = set()
+            if os.path.isdir(self.root):
+                for entry in os.scandir(self.root):
+                    if not entry.is_dir():
+                        continue
+                    mtime_ns = self._stat(entry.name)
+                    if mtime_ns is None:
+                        continue
+                    seen.add(entry.name)
+                    if self._mtimes.get(entry.name) != mtime_ns:
+                        self._load(entry.name, mtime_ns)
+            for category in set(self._mtimes) - seen:
+                self._unindex(category)
+                self._dirty = True
+            self._built = True
+
+    def update(self, category: str, data: Dict[str, dict]) -> None:
+        """Replace the indexed records of one category after its file has been written."""
+        with self._lock:
+            if not self._built:
+                return
+            mtime_ns = self._stat(category)
+            if mtime_ns is None:
+                self._unindex(category)
+            else:
+                self._index(category, data, mtime_ns)
+
+    def _validate(self, category: str) -> bool:
+        # Cheap O(1) freshness check of the single file a hit came from
+        mtime_ns = self._stat(category)
+        if mtime_ns == self._mtimes.get(category):
+            return True
+        if mtime_ns is None:
+            self._unindex(category)
+        else:
+            self._load(category, mtime_ns)
+        return False
+
+    def _find(self, brand_name: str) -> Optional[Tuple[str, dict]]:
+        owners = self._exact.get(brand_name)
+        if owners:
+            return owners[0], self._categories[owners[0]][brand_name]
+        matches = self._normalized.get(normalize_drug_name(brand_name))
+        if matches:
+            category, name = matches[0]
+            return category, self._categories[category][name]
+        return None
+
+    def lookup(self, brand_name: str) -> Optional[Tuple[str, dict]]:
+        """
+        Find a record by brand name, trying an exact match first and then a normalized one.
+
+        Returns:
+            Optional[Tuple[str, dict]]: (category, record) if found, otherwise None
+        """
+        with self._lock:
+            if not self._built:
+                self.refresh()
+            found = self._find(brand_name)
+            if found and self._validate(found[0]):
+                return found
+            # The hit was stale or nothing matched: pick up files written by other processes
+            self.refresh()
+            return self._find(brand_name)
+
+
+def _search_terms(query: str, fields: Sequence[str]) -> List[str]:
+    """Validate the searched fields and reduce a search_text query to its lower-cased words."""
+    unknown = [field for field in fields if field not in TEXT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}; choose from {list(TEXT_FIELDS)}")
+    return re.findall(r"\w+", query.casefold()) if fields else []
+
+
+def _clamp_limit(limit: int) -> int:
+    return max(1, min(int(limit), MAX_SEARCH_RESULTS))
+
+
+def _snippet(text: str, match: re.Match, context: int = 60) -> str:
+    """The text around a match, with the match in **bold** like the FTS5 snippets."""
+    start, end = max(0, match.start() - context), min(len(text), match.end() + context)
+    return (
+        f"{'...' if start else ''}{text[start:match.start()]}**{match.group()}**"
+        f"{text[match.end():end]}{'...' if end < len(text) else ''}"
+    )
+
+
+class DrugStore:
+    """
+    Storage backend for saved drug records.
+
+    Records are grouped by category (the substance folder name `search_drug_info` derives from the
+    searched drug name) and keyed by brand name within a category. Implementations must be safe to
+    call from several worker threads at once.
+    """
+
+    def list_categories(self) -> List[str]:
+        """Return the names of all saved categories, sorted."""
+        raise NotImplementedError
+
+    def get_category(self, category: str) -> Optional[Dict[str, dict]]:
+        """Return {brand_name: record} for a category, or None if it was never saved."""
+        raise NotImplementedError
+
+    def get_record(self, brand_name: str) -> Optional[Tuple[str, dict]]:
+        """Find a record by brand name (exact first, then normalized); returns (category, record)."""
+        raise NotImplementedError
+
+    def iter_names(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield (category, brand_name, substance_name) for every saved record."""
+        for category in self.list_categories():
+            for brand_name, record in (self.get_category(category) or {}).items():
+                yield category, brand_name, record.get("substance_name", "Unknown")
+
+    def save_category(self, category: str, records: Dict[str, dict]) -> None:
+        """Persist the records fetched for a category, merged into the records already saved there."""
+        raise NotImplementedError
+
+    def add_records(self, category: str, records: Dict[str, dict]) -> None:
+        """Insert or update records in a category, keeping the records already saved there."""
+        raise NotImplementedError
+
+    def get_checkpoint(self, job: str) -> Optional[dict]:
+        """Return the saved progress of a bulk ingest job, if any."""
+        raise NotImplementedError
+
+    def put_checkpoint(self, job: str, state: dict) -> None:
+        """Save the progress of a bulk ingest job."""
+        raise NotImplementedError
+
+    def search_text(self, query: str, fields: Sequence[str] = TEXT_FIELDS, limit: int = 10) -> List[dict]:
+        """
+        Full-text search over the label text of saved records, best matches first.
+
+        This fallback scans every saved record: each query word must start a word of one of the
+        searched fields, and records are ranked by how often the words occur. Stores with an index
+        (SQLiteStore) override it.
+
+        Args:
+            query (str): Words to search for; anything else in it is ignored
+            fields (Sequence[str]): Fields of TEXT_FIELDS to search
+            limit (int): Maximum number of records, clamped to 1..MAX_SEARCH_RESULTS
+
+        Returns:
+            List[dict]: One entry per matching record with its category, brand_name,
+            substance_name, score and a snippet per searched field that matched
+        """
+        terms = _search_terms(query, fields)
+        if not terms:
+            return []
+        pattern = re.compile(r"\b(?:%s)\w*" % "|".join(map(re.escape, terms)), re.IGNORECASE)
+        hits = []
+        for category in self.list_categories():
+            for brand_name, record in (self.get_category(category) or {}).items():
+                found: Dict[str, List[re.Match]] = {}
+                for field in fields:
+                    matches = list(pattern.finditer(record.get(field) or ""))
+                    if matches:
+                        found[field] = matches
+                words = {match.group().casefold() for matches in found.values() for match in matches}
+                if not all(any(word.startswith(term) for word in words) for term in terms):
+                    continue
+                hits.append({
+                    "category": category,
+                    "brand_name": brand_name,
+                    "substance_name": record.get("substance_name"),
+                    "score": sum(len(matches) for matches in found.values()),
+                    "snippets": {field: _snippet(record[field], matches[0]) for field, matches in found.items()},
+                })
+        hits.sort(key=lambda hit: -hit["score"])
+        return hits[:_clamp_limit(limit)]
+
+    def get_query(self, category: str, query: str, max_results: int) -> Optional[Tuple[float, List[str]]]:
+        """Return (fetched_at, brand_names) recorded for an openFDA query saved under a category, if any."""
+        raise NotImplementedError
+
+    def put_query(self, category: str, query: str, max_results: int, brand_names: List[str]) -> None:
+        """Record which brand names an openFDA query returned for a category."""
+        raise NotImplementedError
+
+    def version(self, category: Optional[str] = None) -> Optional[tuple]:
+        """
+        Cheap token that changes whenever a category is written, also by another process.
+
+        Args:
+            category (Optional[str]): Category to check, or None for the list of categories
+
+        Returns:
+            Optional[tuple]: Opaque comparable token; None if the category was never saved
+        """
+        raise NotImplementedError
+
+    def data_version(self) -> tuple:
+        """
+        Token that changes with every write to any category, also by another process.
+
+        Unlike version(None), which only tracks the list of categories, this also changes when
+        records are added to an existing category.
+
+        Returns:
+            tuple: Opaque comparable token
+        """
+        raise NotImplementedError
+
+    def warm(self) -> None:
+        """Start loading in-memory lookup structures in the background so the first lookup does not wait."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class JsonDirStore(DrugStore):
+    """
+    The original layout: one <root>/<category>/drug_info.json per substance.
+
+    Brand-name lookups go through a BrandIndex so they do not re-read every file. Files are
+    replaced atomically, and the read-merge-write of a category is serialized per category.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index = BrandIndex(root, os.path.join(root, INDEX_SNAPSHOT))
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _category_lock(self, category: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(category, threading.Lock())
+
+    def _file_path(self, category: str, name: str = DRUG_FILE) -> str:
+        return os.path.join(self.root, category, name)
+
+    def list_categories(self) -> List[str]:
+        categories = []
+        if os.path.isdir(self.root):
+            for entry in os.scandir(self.root):
+                if entry.is_dir() and os.path.exists(self._file_path(entry.name)):
+                    categories.append(entry.name)
+        return sorted(categories)
+
+    def get_category(self, category: str) -> Optional[Dict[str, dict]]:
+        try:
+            with open(self._file_path(category), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get_record(self, brand_name: str) -> Optional[Tuple[str, dict]]:
+        return self.index.lookup(brand_name)
+
+    def save_category(self, category: str, records: Dict[str, dict]) -> None:
+        with self._category_lock(category):
+            os.makedirs(os.path.join(self.root, category), exist_ok=True)
+            merged = self.get_category(category) or {}
+            merged.update(records)
+            write_json_atomic(self._file_path(category), merged, indent=2, ensure_ascii=False)
+            self.index.update(category, merged)
+
+    def add_records(self, category: str, records: Dict[str, dict]) -> None:
+        # Saving already merges into the existing records
+        self.save_category(category, records)
+
+    def version(self, category: Optional[str] = None) -> Optional[tuple]:
+        # A new category folder changes the root's mtime; a rewrite changes the file's mtime and
+        # usually its size (mtime alone can repeat within the filesystem's timestamp granularity)
+        try:
+            if category is None:
+                return (os.stat(self.root).st_mtime_ns,)
+            stat = os.stat(self._file_path(category))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def data_version(self) -> tuple:
+        # The folder layout has no shared write counter; sum the versions of every category file
+        mtimes = sizes = 0
+        for category in self.list_categories():
+            version = self.version(category)
+            if version is not None:
+                mtimes += version[0]
+                sizes += version[1]
+        return self.version(), mtimes, sizes
+
+    def _checkpoint_path(self, job: str) -> str:
+        return os.path.join(self.root, CHECKPOINT_DIR, f"{job}.json")
+
+    def get_checkpoint(self, job: str) -> Optional[dict]:
+        try:
+            with open(self._checkpoint_path(job), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put_checkpoint(self, job: str, state: dict) -> None:
+        os.makedirs(os.path.join(self.root, CHECKPOINT_DIR), exist_ok=True)
+        write_json_atomic(self._checkpoint_path(job), state, ensure_ascii=False)
+
+    def get_query(self, category: str, query: str, max_results: int) -> Optional[Tuple[float, List[str]]]:
+        if not os.path.isfile(self._file_path(category)):
+            return None
+        try:
+            with open(self._file_path(category, QUERY_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if meta.get("query") != query or meta.get("max_results") != max_results:
+            return None
+        return meta.get("fetched_at", 0), meta.get("brand_names", [])
+
+    def put_query(self, category: str, query: str, max_results: int, brand_names: List[str]) -> None:
+        # Only the query that produced the current drug_info.json is kept next to it
+        meta = {"query": query, "max_results": max_results, "fetched_at": time.time(), "brand_names": brand_names}
+        write_json_atomic(self._file_path(category, QUERY_FILE), meta, ensure_ascii=False)
+
+    def warm(self) -> None:
+        # Lookups wait on the index lock until the build (or snapshot load) is done
+        threading.Thread(target=self.index.refresh, name="brand-index-warm", daemon=True).start()
+
+    def close(self) -> None:
+        # Let the next server process start from this one's index instead of re-parsing every file
+        try:
+            self.index.write_snapshot()
+        except OSError as e:
+            print(f"Could not write the index snapshot: {str(e)}", file=sys.stderr)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    name TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drugs (
+    category TEXT NOT NULL,
+    brand_name TEXT NOT NULL,
+    brand_key TEXT NOT NULL,
+    substance_name TEXT,
+    manufacturer TEXT,
+    route TEXT,
+    purpose TEXT,
+    usage TEXT,
+    warnings TEXT,
+    adverse_reactions TEXT,
+    boxed_warning TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (category, brand_name)
+);
+CREATE INDEX IF NOT EXISTS idx_drugs_brand_name ON drugs (brand_name);
+CREATE INDEX IF NOT EXISTS idx_drugs_brand_key ON drugs (brand_key);
+CREATE INDEX IF NOT EXISTS idx_drugs_substance_name ON drugs (substance_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_drugs_manufacturer ON drugs (manufacturer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_drugs_route ON drugs (route);
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    brand_names TEXT NOT NULL,
+    PRIMARY KEY (query, max_results)
+);
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    job TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+-- Single row counting write transactions, read by data_version()
+CREATE TABLE IF NOT EXISTS store_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    writes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (id, writes) VALUES (0, 0);
+"""
+
+# External-content FTS5 index over the drugs table, kept in sync by triggers
+_FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS drugs_fts USING fts5(
+    {", ".join(TEXT_FIELDS)},
+    content='drugs', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS drugs_fts_insert AFTER INSERT ON drugs BEGIN
+    INSERT INTO drugs_fts (rowid, {", ".join(TEXT_FIELDS)})
+    VALUES (new.rowid, {", ".join(f"new.{field}" for field in TEXT_FIELDS)});
+END;
+CREATE TRIGGER IF NOT EXISTS drugs_fts_delete AFTER DELETE ON drugs BEGIN
+    INSERT INTO drugs_fts (drugs_fts, rowid, {", ".join(TEXT_FIELDS)})
+    VALUES ('delete', old.rowid, {", ".join(f"old.{field}" for field in TEXT_FIELDS)});
+END;
+CREATE TRIGGER IF NOT EXISTS drugs_fts_update AFTER UPDATE ON drugs BEGIN
+    INSERT INTO drugs_fts (drugs_fts, rowid, {", ".join(TEXT_FIELDS)})
+    VALUES ('delete', old.rowid, {", ".join(f"old.{field}" for field in TEXT_FIELDS)});
+    INSERT INTO drugs_fts (rowid, {", ".join(TEXT_FIELDS)})
+    VALUES (new.rowid, {", ".join(f"new.{field}" for field in TEXT_FIELDS)});
+END;
+INSERT INTO drugs_fts (drugs_fts) VALUES ('rebuild');
+"""
+
+_UPSERT_DRUG = f"""
+INSERT INTO drugs (category, brand_key, updated_at, {", ".join(RECORD_FIELDS)})
+VALUES (?, ?, ?, {", ".join("?" for _ in RECORD_FIELDS)})
+ON CONFLICT (category, brand_name) DO UPDATE SET
+    brand_key = excluded.brand_key,
+    updated_at = excluded.updated_at,
+    {", ".join(f"{field} = excluded.{field}" for field in RECORD_FIELDS if field != "brand_name")}
+"""
+
+
+class SQLiteStore(DrugStore):
+    """
+    All categories in one SQLite database in WAL mode.
+
+    Each worker thread gets its own connection, so readers never wait for a writer and writers
+    queue on SQLite's lock (busy_timeout) instead of corrupting anything. Records are upserted one
+    by one, so saving a category never rewrites records it did not touch.
+
+    Args:
+        path (str): Database file path
+        timeout (float): Seconds to wait for another writer before giving up
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'drugs_fts'").fetchone()
+        if not has_fts:
+            # Also indexes records of databases created before full-text search existed
+            conn.executescript(f"BEGIN; {_FTS_SCHEMA} COMMIT;")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Each connection is used by its own thread only; close() may run on another one
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> dict:
+        return {field: row[field] for field in RECORD_FIELDS}
+
+    def list_categories(self) -> List[str]:
+        rows = self._conn().execute("SELECT name FROM categories ORDER BY name")
+        return [row["name"] for row in rows]
+
+    def get_category(self, category: str) -> Optional[Dict[str, dict]]:
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM categories WHERE name = ?", (category,)).fetchone() is None:
+            return None
+        rows = conn.execute("SELECT * FROM drugs WHERE category = ? ORDER BY rowid", (category,))
+        return {row["brand_name"]: self._record(row) for row in rows}
+
+    def get_record(self, brand_name: str) -> Optional[Tuple[str, dict]]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT * FROM drugs WHERE brand_name = ? ORDER BY rowid LIMIT 1", (brand_name,)
+        ).fetchone()
+        if row is None:
+            row = conn.execute(
+                "SELECT * FROM drugs WHERE brand_key = ? ORDER BY rowid LIMIT 1",
+                (normalize_drug_name(brand_name),),
+            ).fetchone()
+        if row is None:
+            return None
+        return row["category"], self._record(row)
+
+    def iter_names(self) -> Iterator[Tuple[str, str, str]]:
+        yield from self._conn().execute("SELECT category, brand_name, substance_name FROM drugs")
+
+    def save_category(self, category: str, records: Dict[str, dict]) -> None:
+        self.add_categories({category: records})
+
+    def add_categories(self, batch: Dict[str, Dict[str, dict]]) -> None:
+        """
+        Upsert the records of several categories in a single transaction.
+
+        Args:
+            batch (Dict[str, Dict[str, dict]]): {category: {brand_name: record}}
+        """
+        now = time.time()
+        rows = [
+            (category, normalize_drug_name(brand_name), now,
+             *(brand_name if field == "brand_name" else record.get(field) for field in RECORD_FIELDS))
+            for category, records in batch.items()
+            for brand_name, record in records.items()
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO categories (name, updated_at) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET updated_at = excluded.updated_at",
+                [(category, now) for category in batch],
+            )
+            conn.executemany(_UPSERT_DRUG, rows)
+            conn.execute("UPDATE store_meta SET writes = writes + 1")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add_records(self, category: str, records: Dict[str, dict]) -> None:
+        # Saving already upserts record by record
+        self.save_category(category, records)
+
+    def version(self, category: Optional[str] = None) -> Optional[tuple]:
+        conn = self._conn()
+        if category is None:
+            # Categories are never deleted, so the list only changes when the count does
+            return tuple(conn.execute("SELECT count(*) FROM categories").fetchone())
+        row = conn.execute("SELECT updated_at FROM categories WHERE name = ?", (category,)).fetchone()
+        return tuple(row) if row else None
+
+    def data_version(self) -> tuple:
+        return tuple(self._conn().execute("SELECT writes FROM store_meta").fetchone())
+
+    def get_checkpoint(self, job: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT state FROM ingest_checkpoints WHERE job = ?", (job,)).fetchone()
+        return json.loads(row["state"]) if row else None
+
+    def put_checkpoint(self, job: str, state: dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO ingest_checkpoints (job, state, updated_at) VALUES (?, ?, ?)",
+            (job, json.dumps(state, ensure_ascii=False), time.time()),
+        )
+
+    def search_text(self, query: str, fields: Sequence[str] = TEXT_FIELDS, limit: int = 10) -> List[dict]:
+        # Treat the query as plain words (all required) rather than raw FTS5 syntax
+        terms = _search_terms(query, fields)
+        if not terms:
+            return []
+        match = "{%s}: (%s)" % (" ".join(fields), " ".join(f'"{term}"' for term in terms))
+        snippets = ", ".join(
+            f"snippet(drugs_fts, {TEXT_FIELDS.index(field)}, '**', '**', '...', 16) AS {field}"
+            for field in fields
+        )
+        rows = self._conn().execute(
+            f"SELECT d.category, d.brand_name, d.substance_name, bm25(drugs_fts) AS score, {snippets} "
+            "FROM drugs_fts JOIN drugs d ON d.rowid = drugs_fts.rowid "
+            "WHERE drugs_fts MATCH ? ORDER BY score LIMIT ?",
+            (match, _clamp_limit(limit)),
+        )
+        return [
+            {
+                "category": row["category"],
+                "brand_name": row["brand_name"],
+                "substance_name": row["substance_name"],
+                # bm25() is lower-is-better; flip it so higher scores mean better matches
+                "score": round(-row["score"], 4),
+                "snippets": {field: row[field] for field in fields if "**" in (row[field] or "")},
+            }
+            for row in rows
+        ]
+
+    def get_query(self, category: str, query: str, max_results: int) -> Optional[Tuple[float, List[str]]]:
+        row = self._conn().execute(
+            "SELECT fetched_at, brand_names FROM queries WHERE query = ? AND max_results = ? AND category = ?",
+            (query, max_results, category),
+        ).fetchone()
+        if row is None:
+            return None
+        return row["fetched_at"], json.loads(row["brand_names"])
+
+    def put_query(self, category: str, query: str, max_results: int, brand_names: List[str]) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO queries (query, max_results, category, fetched_at, brand_names) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (query, max_results, category, time.time(), json.dumps(brand_names, ensure_ascii=False)),
+        )
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def category_for(drug_name: str) -> str:
+    """Category (folder) name a searched drug name is saved under."""
+    return drug_name.lower().replace(" ", "_")
+
+
+def extract_record(entry: dict) -> dict:
+    """Pick the label fields we keep from one openFDA label result."""
+    openfda_data = entry.get("openfda", {})
+    return {
+        "brand_name": openfda_data.get("brand_name", ["Unknown"])[0],
+        "substance_name": openfda_data.get("substance_name", ["Unknown"])[0],
+        "manufacturer": openfda_data.get("manufacturer_name", ["Unknown"])[0],
+        "route": openfda_data.get("route", ["Unknown"])[0],
+        "purpose": entry.get("purpose", ["Not specified"])[0],
+        "usage": entry.get("indications_and_usage", ["Not specified"])[0],
+        "warnings": entry.get("warnings", ["Not specified"])[0],
+        "adverse_reactions": entry.get("adverse_reactions", ["Not specified"])[0],
+        "boxed_warning": entry.get("boxed_warning", ["None"])[0]
+    }
+
+
+def iter_json_categories(root: str) -> Iterator[Tuple[str, Dict[str, dict]]]:
+    """Yield (category, records) for every readable drug_info.json in the folder layout."""
+    if not os.path.isdir(root):
+        return
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        file_path = os.path.join(entry.path, DRUG_FILE)
+        if not entry.is_dir() or not os.path.isfile(file_path):
+            continue
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                yield entry.name, json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Error reading {file_path}: {str(e)}", file=sys.stderr)
+
+
+def migrate_json_dir(root: str, store: DrugStore) -> int:
+    """
+    Copy every category of the folder layout into another store.
+
+    Returns:
+        int: Number of records migrated
+    """
+    migrated = 0
+    for category, records in iter_json_categories(root):
+        store.save_category(category, records)
+        migrated += len(records)
+    return migrated
+
+
+def open_store(root: str, backend: str = "sqlite") -> DrugStore:
+    """
+    Open the drug store under `root`.
+
+    Args:
+        root (str): Drug directory (holds drugs.db, or the per-category folders for 'json')
+        backend (str): 'sqlite' (default) or 'json'
+
+    Returns:
+        DrugStore: The opened store. A brand-new SQLite database is seeded from any existing
+        folder layout under `root`, so switching backends does not lose saved data.
+    """
+    if backend == "json":
+        return JsonDirStore(root)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown drug store backend: {backend}")
+    path = os.path.join(root, DB_FILE)
+    is_new = not os.path.exists(path)
+    store = SQLiteStore(path)
+    if is_new:
+        migrate_json_dir(root, store)
+    return store
@@ -0,0 +1,179 @@
+"""
+Per-category aggregates behind the comparison and safety-summary tools.
+
+A category's records are reduced once to the facts the tools report (manufacturers, routes,
+which warning statements the labels share and which only one label carries, boxed warnings), so a
+tool call returns a compact structured answer instead of the model diffing every full label.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+# Placeholders extract_record writes for label fields openFDA did not return
+MISSING_VALUES = {"Unknown", "Not specified", "None", ""}
+# Statements shorter than this (headings such as "Ask a doctor before use if you have") are skipped
+MIN_STATEMENT_LENGTH = 25
+
+_STATEMENT_SPLIT = re.compile(r"(?<=[.!?;])\s+|\s*[\n•▪●]+\s*|\s+-\s+")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def _present(value: Any) -> bool:
+    return isinstance(value, str) and value.strip() not in MISSING_VALUES
+
+
+def split_statements(text: str) -> List[Tuple[str, str]]:
+    """
+    Split label text into its statements (roughly sentences and bullet items).
+
+    Returns:
+        List[Tuple[str, str]]: (match key, statement) pairs, in order and without repeated keys;
+        the key ignores case, punctuation and spacing so the same sentence matches across labels
+    """
+    if not _present(text):
+        return []
+    statements = []
+    seen = set()
+    for part in _STATEMENT_SPLIT.split(text):
+        statement = part.strip()
+        if len(statement) < MIN_STATEMENT_LENGTH:
+            continue
+        key = " ".join(_NON_WORD.sub(" ", statement.casefold()).split())
+        if key and key not in seen:
+            seen.add(key)
+            statements.append((key, statement))
+    return statements
+
+
+def _group(values: Dict[str, str]) -> Dict[str, List[str]]:
+    """Invert {brand_name: value} to {value: [brand_names]}, largest group first."""
+    groups: Dict[str, List[str]] = {}
+    for brand_name, value in values.items():
+        groups.setdefault(value if _present(value) else "Unknown", []).append(brand_name)
+    return dict(sorted(groups.items(), key=lambda item: (-len(item[1]), item[0])))
+
+
+def _statement_stats(records: Dict[str, dict], field: str) -> Dict[str, Any]:
+    """Statements of `field` ranked by how many labels carry them, and those unique to one label."""
+    text_of: Dict[str, str] = {}
+    brands_of: Dict[str, List[str]] = {}
+    labelled = 0
+    for brand_name, record in records.items():
+        statements = split_statements(record.get(field, ""))
+        labelled += bool(statements)
+        for key, statement in statements:
+            text_of.setdefault(key, statement)
+            brands_of.setdefault(key, []).append(brand_name)
+
+    ranked = sorted(brands_of, key=lambda key: (-len(brands_of[key]), text_of[key]))
+    statements = [{"statement": text_of[key], "products": len(brands_of[key])} for key in ranked]
+    unique: Dict[str, List[str]] = {}
+    for key in ranked:
+        if len(brands_of[key]) == 1:
+            unique.setdefault(brands_of[key][0], []).append(text_of[key])
+    return {"labelled_products": labelled, "statements": statements, "unique": unique}
+
+
+def aggregate_category(category: str, records: Dict[str, dict]) -> Dict[str, Any]:
+    """
+    Reduce the records of one category to the aggregates the comparison tools read.
+
+    Args:
+        category (str): Category name
+        records (Dict[str, dict]): {brand_name: record} as returned by DrugStore.get_category
+
+    Returns:
+        Dict[str, Any]: Product, manufacturer, route and substance groupings, warning and
+        adverse-reaction statement stats, and the boxed warning of every product that has one
+    """
+    return {
+        "category": category,
+        "product_count": len(records),
+        "manufacturers": _group({brand: r.get("manufacturer", "") for brand, r in records.items()}),
+        "routes": _group({brand: r.get("route", "") for brand, r in records.items()}),
+        "substances": _group({brand: r.get("substance_name", "") for brand, r in records.items()}),
+        "products": {
+            brand: {
+                "manufacturer": r.get("manufacturer", "Unknown"),
+                "route": r.get("route", "Unknown"),
+                "purpose": r.get("purpose", "Not specified"),
+                "has_boxed_warning": _present(r.get("boxed_warning")),
+            }
+            for brand, r in records.items()
+        },
+        "warnings": _statement_stats(records, "warnings"),
+        "adverse_reactions": _statement_stats(records, "adverse_reactions"),
+        "boxed_warnings": {
+            brand: r["boxed_warning"] for brand, r in records.items() if _present(r.get("boxed_warning"))
+        },
+    }
+
+
+def _clip(text: str, length: int) -> str:
+    return f"{text[:length]}{'...' if len(text) > length else ''}"
+
+
+def comparison_view(aggregate: Dict[str, Any], max_items: int = 10) -> Dict[str, Any]:
+    """
+    Side-by-side comparison of the products in a category, cut down to `max_items` per list.
+
+    Returns:
+        Dict[str, Any]: Manufacturers and routes with their products, one row per product
+        (manufacturer, route, boxed warning, number of warnings no other product carries), the
+        warnings shared by several products and a sample of each product's unique warnings
+    """
+    warnings = aggregate["warnings"]
+    products = list(aggregate["products"].items())
+    return {
+        "category": aggregate["category"],
+        "product_count": aggregate["product_count"],
+        "manufacturers": {name: len(brands) for name, brands in aggregate["manufacturers"].items()},
+        "routes": {name: len(brands) for name, brands in aggregate["routes"].items()},
+        "substances": list(aggregate["substances"]),
+        "products": [
+            {
+                "brand_name": brand,
+                "manufacturer": info["manufacturer"],
+                "route": info["route"],
+                "has_boxed_warning": info["has_boxed_warning"],
+                "unique_warnings": len(warnings["unique"].get(brand, [])),
+            }
+            for brand, info in products[:max_items]
+        ],
+        "products_omitted": max(0, len(products) - max_items),
+        "shared_warnings": [
+            {**item, "statement": _clip(item["statement"], 300)}
+            for item in warnings["statements"][:max_items] if item["products"] > 1
+        ],
+        "unique_warnings": {
+            brand: [_clip(statement, 200) for statement in statements[:3]]
+            for brand, statements in list(warnings["unique"].items())[:max_items]
+        },
+        "products_with_boxed_warning": list(aggregate["boxed_warnings"])[:max_items],
+    }
+
+
+def safety_view(aggregate: Dict[str, Any], max_items: int = 10) -> Dict[str, Any]:
+    """
+    Safety profile of a category, cut down to `max_items` per list.
+
+    Returns:
+        Dict[str, Any]: Boxed warnings by product, the most common warning and adverse-reaction
+        statements with how many products carry them, and how many labels have each section
+    """
+    warnings = aggregate["warnings"]
+    reactions = aggregate["adverse_reactions"]
+    boxed = aggregate["boxed_warnings"]
+    return {
+        "category": aggregate["category"],
+        "product_count": aggregate["product_count"],
+        "boxed_warning_count": len(boxed),
+        "boxed_warnings": {brand: _clip(text, 400) for brand, text in list(boxed.items())[:max_items]},
+        "products_with_warnings": warnings["labelled_products"],
+        "common_warnings": [
+            {**item, "statement": _clip(item["statement"], 300)} for item in warnings["statements"][:max_items]
+        ],
+        "products_with_adverse_reactions": reactions["labelled_products"],
+        "common_adverse_reactions": [
+            {**item, "statement": _clip(item["statement"], 300)} for item in reactions["statements"][:max_items]
+        ],
+    }
@@ -1,87 +1,468 @@
-import requests
+import argparse
+import asyncio
+import functools
 import json
 import os
-from typing import List
-from mcp.server.fastmcp import FastMCP
+import signal
+import sys
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Union
+from urllib.parse import quote
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.lowlevel import NotificationOptions
 
-DRUG_DIR = "drugs"
+from drug_store import (
+    TEXT_FIELDS,
+    SQLiteStore,
+    category_for,
+    extract_record,
+    migrate_json_dir,
+    normalize_drug_name,
+    open_store,
+)
+from drug_summary import _clip, aggregate_category, comparison_view, safety_view
+from metrics import Profiler, get_metrics
+from name_index import NameIndex
+from openfda_client import (
+    OPENFDA_DAILY_QUOTA,
+    OPENFDA_DAILY_QUOTA_WITH_KEY,
+    OPENFDA_RATE_PER_MINUTE,
+    OpenFDAError,
+    get_client,
+)
+from query_cache import QueryCache, VersionedCache
+
+DRUG_DIR = os.environ.get("DRUG_DIR", "drugs")
+# 'sqlite' (one drugs.db in DRUG_DIR) or 'json' (the original per-category drug_info.json folders)
+DRUG_STORE_BACKEND = os.environ.get("DRUG_STORE", "sqlite")
 
 # Initialize the FastMCP server
 mcp = FastMCP("research")
+# Advertise resources.listChanged, which _category_saved sends when a write adds a category. FastMCP
+# has no setting for it; every transport builds its initialization options through this method.
+mcp._mcp_server.create_initialization_options = functools.partial(
+    mcp._mcp_server.create_initialization_options, NotificationOptions(resources_changed=True)
+)
+
+store = open_store(DRUG_DIR, DRUG_STORE_BACKEND)
+query_cache = QueryCache.from_env(store)
+name_index = NameIndex(store)
+metrics = get_metrics()
+
+# Maximum number of substances OR-ed into one openFDA query by search_drugs_batch
+BATCH_GROUP_SIZE = 10
+# Maximum number of openFDA queries a single search_drugs_batch call keeps in flight
+BATCH_CONCURRENCY = int(os.environ.get("DRUG_BATCH_CONCURRENCY", "4"))
+
+# Category -> lock serializing its writes; a lock disappears once no task holds or waits for it
+_category_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+CATEGORIES_URI = "drugs://categories"
+# Rendered resource markdown by uri, tagged with the store version it was rendered from
+_rendered = VersionedCache(int(os.environ.get("DRUG_RENDER_CACHE_SIZE", "128")))
+# Comparison/safety aggregates by category, tagged with the store version they were computed from
+_aggregates = VersionedCache(int(os.environ.get("DRUG_AGGREGATE_CACHE_SIZE", "128")))
+
+
+def _search_term(drug_name: str) -> str:
+    # Multi-word names are searched as a phrase; everything is percent-encoded so names with
+    # '&', '#' or '+' cannot break out of the search parameter
+    term = " ".join(drug_name.replace('"', " ").split())
+    return quote(f'"{term}"' if " " in term else term, safe="")
+
+
+def _label_search(drug_names: List[str]) -> str:
+    # Each name matches on brand_name OR substance_name; '+' separated clauses are OR-ed by openFDA
+    return "+".join(
+        f"openfda.brand_name:{term}+openfda.substance_name:{term}" for term in map(_search_term, drug_names)
+    )
+
+
+def _index_names(category: str, results: List[dict]) -> None:
+    # Every brand, substance and generic name on a label becomes a synonym of the others
+    labels = []
+    for entry in results:
+        openfda_data = entry.get("openfda", {})
+        labels.append((
+            openfda_data.get("brand_name", []),
+            openfda_data.get("substance_name", []) + openfda_data.get("generic_name", []),
+        ))
+    name_index.add_labels(category, labels)
+
+
+def _label_query(drug_names: List[str], limit: int) -> str:
+    return f"/drug/label.json?search={_label_search(drug_names)}&limit={limit}"
+
+
+async def _offload(fn: Callable, *args: Any) -> Any:
+    """Run a blocking store or cache call in a worker thread, timed into store_seconds{op}."""
+    with metrics.timer("store_seconds", op=fn.__qualname__.rsplit("<locals>.", 1)[-1]):
+        return await asyncio.to_thread(fn, *args)
+
+
+def _category_lock(category: str) -> asyncio.Lock:
+    lock = _category_locks.get(category)
+    if lock is None:
+        lock = _category_locks[category] = asyncio.Lock()
+    return lock
+
+
+def _category_uri(category: str) -> str:
+    return f"drugs://{category}"
+
+
+async def _category_saved(category: str, created: bool, ctx: Optional[Context] = None) -> None:
+    """
+    Drop the rendered resources a write made stale and tell the client when a category was added.
+
+    The server does not support resource subscriptions, so changes to existing resources are not
+    announced; a write that adds a category sends notifications/resources/list_changed.
+
+    Args:
+        category (str): The category that was written
+        created (bool): Whether the write added the category (changing drugs://categories)
+        ctx (Optional[Context]): Context of the tool call that wrote, used to send the notification
+    """
+    for uri in [_category_uri(category)] + ([CATEGORIES_URI] if created else []):
+        _rendered.pop(uri)
+    _aggregates.pop(category)
+    if ctx is None or not created:
+        return
+    try:
+        await ctx.session.send_resource_list_changed()
+    except Exception as e:
+        # Notifications only help clients cache; the write itself already succeeded
+        print(f"Could not send the resource list change for {category}: {str(e)}", file=sys.stderr)
+
+
+async def _save_results(
+    drug_name: str, max_results: int, results: List[dict], ctx: Optional[Context] = None
+) -> List[str]:
+    """Save the results for one substance under its category and return the brand names."""
+    category = category_for(drug_name)
+
+    # Collect drug information
+    drug_info = {}
+    brand_names = []
+
+    for entry in results:
+        info = extract_record(entry)
+        drug_info[info["brand_name"]] = info
+        brand_names.append(info["brand_name"])
+
+    # Save to the store off the event loop, merged into the records already saved there
+    def persist() -> bool:
+        created = store.version(category) is None
+        store.save_category(category, drug_info)
+        query_cache.put((normalize_drug_name(drug_name), max_results), category, brand_names)
+        _index_names(category, results)
+        return created
+
+    # Writes to one category queue up here instead of occupying worker threads; other
+    # categories are written in parallel
+    async with _category_lock(category):
+        created = await _offload(persist)
+    await _category_saved(category, created, ctx)
+
+    print(f"\n Drug info saved under category: {category}", file=sys.stderr)
+    print("\n Found the following:", file=sys.stderr)
+    for name in brand_names:
+        print(f"- {name}", file=sys.stderr)
+
+    return brand_names
+
+
+def _correct_name(drug_name: str) -> str:
+    """Return drug_name, or the known name it is a confident misspelling of."""
+    candidate = name_index.best(drug_name)
+    if candidate and candidate["score"] < 1.0:
+        return candidate["name"]
+    return drug_name
+
+
+async def _search_corrected(drug_name: str, max_results: int, ctx: Optional[Context] = None) -> Optional[Dict[str, Any]]:
+    """Search the saved name drug_name misspells, if any; the result names both so the swap is visible."""
+    resolved = await _offload(_correct_name, drug_name)
+    if resolved == drug_name:
+        return None
+    print(f"\n Searching '{resolved}' instead of '{drug_name}'", file=sys.stderr)
+    category = category_for(resolved)
+    brand_names = await _offload(query_cache.get, (normalize_drug_name(resolved), max_results), category)
+    if brand_names is None:
+        status_code, data = await get_client().get_json(_label_query([resolved], max_results))
+        if status_code != 200:
+            return None
+        brand_names = await _save_results(resolved, max_results, data.get("results", []), ctx)
+    return {"requested": drug_name, "searched": resolved, "brand_names": brand_names}
+
 
 @mcp.tool()
-def search_drug_info(drug_name: str, max_results: int = 5) -> List[str]:
+@metrics.timed("tool")
+async def search_drug_info(
+    drug_name: str, max_results: int = 5, ctx: Context = None
+) -> Union[List[str], Dict[str, Any]]:
     """
     Search for drug information from openFDA by drug name (brand or substance).
-    
+
+    If openFDA does not know the name but it is a clear misspelling of a drug saved before, that
+    drug is searched instead and the result says so.
+
     Args:
         drug_name (str): The name of the drug to search (e.g. 'ibuprofen')
         max_results (int): Number of results to fetch (default: 5)
 
     Returns:
-        List[str]: A list of drug brand names found
+        Union[List[str], Dict[str, Any]]: A list of drug brand names found, or, when a corrected
+        name was searched, {"requested": drug_name, "searched": corrected name, "brand_names": [...]}
     """
 
-    # Prepare search query (brand_name OR substance_name)
-    url = f"https://api.fda.gov/drug/label.json?search=openfda.brand_name:{drug_name}+openfda.substance_name:{drug_name}&limit={max_results}"
+    category = category_for(drug_name)
+
+    # Serve repeated queries without touching the network or rewriting the store
+    cached = await _offload(query_cache.get, (normalize_drug_name(drug_name), max_results), category)
+    if cached is not None:
+        print(f"\n Served from cache: {category}", file=sys.stderr)
+        return cached
 
-    # Send request
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Error: {response.status_code}")
+    # Send request through the shared, rate-limited client so the event loop is never blocked.
+    # Quota exhaustion and persistent server errors raise OpenFDAError instead of returning [].
+    status_code, data = await get_client().get_json(_label_query([drug_name], max_results))
+    if status_code == 404:
+        # Only a name openFDA does not know is corrected: a valid name close to a saved one
+        # ('prednisone' next to 'prednisolone') must not be swapped for it
+        corrected = await _search_corrected(drug_name, max_results, ctx)
+        if corrected is not None:
+            return corrected
+    if status_code != 200:
+        print(f"Error: {status_code}", file=sys.stderr)
         return []
 
-    data = response.json()
-    results = data.get("results", [])
+    return await _save_results(drug_name, max_results, data.get("results", []), ctx)
 
-    # Create directory to store results
-    path = os.path.join(DRUG_DIR, drug_name.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
-    file_path = os.path.join(path, "drug_info.json")
 
-    # Collect drug information
-    drug_info = {}
-    brand_names = []
+def _matches(drug_name: str, entry: dict) -> bool:
+    # openFDA matches whole tokens, so a result belongs to a name if all of its tokens appear
+    # in one of the brand/substance/generic names of the label
+    tokens = set(normalize_drug_name(drug_name).split())
+    openfda_data = entry.get("openfda", {})
+    for field in ("brand_name", "substance_name", "generic_name"):
+        for value in openfda_data.get(field, []):
+            if tokens <= set(normalize_drug_name(value).split()):
+                return True
+    return False
 
-    for entry in results:
-        openfda_data = entry.get("openfda", {})
-        brand_name = openfda_data.get("brand_name", ["Unknown"])[0]
-        substance = openfda_data.get("substance_name", ["Unknown"])[0]
-        manufacturer = openfda_data.get("manufacturer_name", ["Unknown"])[0]
-        route = openfda_data.get("route", ["Unknown"])[0]
-
-        info = {
-            "brand_name": brand_name,
-            "substance_name": substance,
-            "manufacturer": manufacturer,
-            "route": route,
-            "purpose": entry.get("purpose", ["Not specified"])[0],
-            "usage": entry.get("indications_and_usage", ["Not specified"])[0],
-            "warnings": entry.get("warnings", ["Not specified"])[0],
-            "adverse_reactions": entry.get("adverse_reactions", ["Not specified"])[0],
-            "boxed_warning": entry.get("boxed_warning", ["None"])[0]
-        }
 
-        drug_info[brand_name] = info
-        brand_names.append(brand_name)
+async def _search_group(
+    drug_names: List[str], max_results: int, ctx: Optional[Context] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch several uncached substances with one OR-ed query, falling back to single queries.
 
-    # Save to file
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(drug_info, f, indent=2, ensure_ascii=False)
+    Only a failure of this query itself (HTTP 400) or a truncated share falls back to one query
+    per name. Rate limiting, quota exhaustion and server errors are reported for every name at
+    once: retrying them name by name would only send more requests at the worst moment.
+    """
+    limit = min(max_results * len(drug_names), 1000)
+    outcome: Dict[str, Dict[str, Any]] = {}
+    fallback = []
 
-    print(f"\n Drug info saved at: {file_path}")
-    print("\n Found the following:")
-    for name in brand_names:
-        print(f"- {name}")
-    
-    return brand_names
+    try:
+        status_code, data = await get_client().get_json(_label_query(drug_names, limit))
+    except OpenFDAError as e:
+        return {name: {"error": str(e)} for name in drug_names}
+
+    if status_code == 404:
+        # openFDA answers 404 when nothing matched any of the names
+        return {name: {"brand_names": [], "cached": False} for name in drug_names}
+    if status_code != 200:
+        if len(drug_names) == 1 or status_code != 400:
+            return {name: {"error": f"openFDA returned HTTP {status_code}"} for name in drug_names}
+        fallback = list(drug_names)
+    else:
+        results = data.get("results", [])
+        truncated = len(results) >= limit
+        for name in drug_names:
+            if len(drug_names) == 1:
+                outcome[name] = {"brand_names": await _save_results(name, max_results, results, ctx), "cached": False}
+                continue
+            own = [entry for entry in results if _matches(name, entry)][:max_results]
+            # A short share is only trustworthy if openFDA returned every match
+            if len(own) < max_results and (truncated or not own):
+                fallback.append(name)
+            else:
+                outcome[name] = {"brand_names": await _save_results(name, max_results, own, ctx), "cached": False}
+
+    for name in fallback:
+        outcome.update(await _search_group([name], max_results, ctx))
+    return outcome
+
+
+@mcp.tool()
+@metrics.timed("tool")
+async def search_drugs_batch(
+    drug_names: List[str], max_results: int = 5, ctx: Context = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Search openFDA for several drugs (brand or substance names) in one call.
+
+    Use this instead of calling search_drug_info repeatedly when comparing drugs. Duplicate names
+    are searched once, cached results are reused, and the remaining names are combined into as few
+    openFDA queries as possible. Each drug is saved to its own category like search_drug_info.
+
+    Args:
+        drug_names (List[str]): The drug names to search (e.g. ['ibuprofen', 'naproxen'])
+        max_results (int): Number of results to fetch per drug (default: 5)
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Per drug name, either {"brand_names": [...], "cached": bool}
+        or {"error": "..."}
+    """
+
+    # Deduplicate on the normalized name, keeping the first spelling the caller used
+    unique: Dict[str, str] = {}
+    for name in drug_names:
+        if name.strip():
+            unique.setdefault(normalize_drug_name(name), name)
+
+    outcome: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for key, name in unique.items():
+        cached = await _offload(query_cache.get, (key, max_results), category_for(name))
+        if cached is not None:
+            outcome[name] = {"brand_names": cached, "cached": True}
+        else:
+            pending.append(name)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(group: List[str]) -> Dict[str, Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await _search_group(group, max_results, ctx)
+            except Exception as e:
+                return {name: {"error": f"Request failed: {str(e)}"} for name in group}
+
+    groups = [pending[i:i + BATCH_GROUP_SIZE] for i in range(0, len(pending), BATCH_GROUP_SIZE)]
+    for result in await asyncio.gather(*(run(group) for group in groups)):
+        outcome.update(result)
+
+    # Report in the order the caller asked
+    return {name: outcome[name] for name in unique.values()}
+
+
+async def ingest_drug(
+    drug_name: str,
+    page_size: int = 100,
+    max_records: Optional[int] = None,
+    restart: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+    ctx: Optional[Context] = None,
+) -> Dict[str, Any]:
+    """
+    Stream every openFDA label for a drug into the store, page by page.
+
+    Progress is checkpointed in the store after each page, so an interrupted or capped run
+    continues where it stopped the next time it is called for the same drug.
+
+    Args:
+        drug_name (str): The drug to ingest (brand or substance name)
+        page_size (int): Labels per openFDA request (max 1000)
+        max_records (Optional[int]): Stop this run after about this many labels (whole pages)
+        restart (bool): Ignore any saved checkpoint and start from the first page
+        progress (Optional[Callable[[str], None]]): Called with a status line after each page
+        ctx (Optional[Context]): Context of the calling tool, used to send resource updates
+
+    Returns:
+        Dict[str, Any]: Summary with the labels fetched by this run, overall, and whether the drug is done
+    """
+    category = category_for(drug_name)
+    job = f"label:{category}"
+    checkpoint = None if restart else await _offload(store.get_checkpoint, job)
+    checkpoint = checkpoint or {"cursor": None, "fetched": 0, "total": None, "done": False}
+    summary = {"drug_name": drug_name, "category": category, "resumed": checkpoint["fetched"] > 0}
+    if checkpoint["done"]:
+        return {**summary, "fetched": 0, "fetched_total": checkpoint["fetched"], "total": checkpoint["total"], "done": True}
+
+    fetched = 0
+    pages = get_client().iter_label_pages(_label_search([drug_name]), page_size, checkpoint["cursor"])
+    try:
+        async for page in pages:
+            records = {}
+            for entry in page.results:
+                info = extract_record(entry)
+                records[info["brand_name"]] = info
+            async with _category_lock(category):
+                created = await _offload(store.version, category) is None
+                await _offload(store.add_records, category, records)
+                await _offload(_index_names, category, page.results)
+            await _category_saved(category, created, ctx)
+
+            fetched += len(page.results)
+            checkpoint = {
+                "cursor": page.next_cursor,
+                "fetched": checkpoint["fetched"] + len(page.results),
+                "total": page.total,
+                "done": page.next_cursor is None,
+            }
+            await _offload(store.put_checkpoint, job, checkpoint)
+            if progress:
+                progress(f"{drug_name}: {checkpoint['fetched']}/{page.total} labels")
+            if max_records is not None and fetched >= max_records:
+                break
+        else:
+            # No pages at all (404) also means there is nothing left to fetch
+            if not checkpoint["done"]:
+                checkpoint = {**checkpoint, "cursor": None, "done": True, "total": checkpoint["total"] or 0}
+                await _offload(store.put_checkpoint, job, checkpoint)
+    finally:
+        await pages.aclose()
+
+    return {
+        **summary,
+        "fetched": fetched,
+        "fetched_total": checkpoint["fetched"],
+        "total": checkpoint["total"],
+        "done": checkpoint["done"],
+    }
+
+
+@mcp.tool()
+@metrics.timed("tool")
+async def bulk_ingest_drug(
+    drug_name: str, max_records: int = 1000, page_size: int = 100, restart: bool = False, ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Download all FDA labels for a drug (not just the first few) into the local store.
+
+    Use this for offline analysis of substances with many labels. Large substances are fetched in
+    several calls: each call saves up to max_records labels and the next call resumes from there.
+    Once an ingest is complete further calls return at once; pass restart=True to fetch the labels
+    again, e.g. to pick up ones openFDA published since. Saved labels are then available to
+    extract_drug_info, search_cached_labels and the resources.
+
+    Args:
+        drug_name (str): The drug to ingest (brand or substance name, e.g. 'ibuprofen')
+        max_records (int): Maximum labels to fetch in this call (default: 1000)
+        page_size (int): Labels per openFDA request (default: 100, max 1000)
+        restart (bool): Ignore the saved progress and start again from the first page (default: False)
+
+    Returns:
+        Dict[str, Any]: Labels fetched in this call and in total, the number openFDA reports, and
+        whether the ingest is complete
+    """
+
+    return await ingest_drug(drug_name, page_size=page_size, max_records=max_records, restart=restart, ctx=ctx)
 
 
 @mcp.tool()
-def extract_drug_info(brand_name: str) -> str:
+@metrics.timed("tool")
+async def extract_drug_info(brand_name: str) -> str:
     """
     Search for information about a specific drug by brand name across all drug_search directories.
 
+    Matching is case-insensitive, so 'ADVIL' finds a record saved as 'Advil'. For any other name the
+    closest saved brand names are suggested rather than returned.
+
     Args:
         brand_name (str): The brand name of the drug to look for
 
@@ -89,101 +470,252 @@ def extract_drug_info(brand_name: str) -> str:
         str: JSON-formatted string with drug info if found, or an error message if not found
     """
 
-    for folder in os.listdir("drugs"):
-        folder_path = os.path.join("drugs", folder)
-        if os.path.isdir(folder_path):
-            file_path = os.path.join(folder_path, "drug_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        if brand_name in data:
-                            return json.dumps(data[brand_name], indent=2, ensure_ascii=False)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    found = await _offload(store.get_record, brand_name)
+    if found:
+        _, record = found
+        return json.dumps(record, indent=2, ensure_ascii=False)
+
+    # Never return a near-miss brand's label as if it were this one ('Novolin R' is not
+    # 'Novolin N'); suggest the closest saved names instead
+    candidates = await _offload(name_index.resolve, brand_name)
+    if candidates:
+        suggestions = ", ".join(candidate["name"] for candidate in candidates)
+        return f"No saved information found for drug brand: {brand_name}. Did you mean: {suggestions}?"
 
     return f"No saved information found for drug brand: {brand_name}"
 
-@mcp.resource("drugs://categories")
-def get_available_drug_categories() -> str:
+@mcp.tool()
+@metrics.timed("tool")
+async def resolve_drug_name(name: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Match a drug name against the names saved locally, tolerating case, typos and brand/generic synonyms.
+
+    Use this before search_drug_info or extract_drug_info when unsure of a spelling or to find
+    the substance of a brand (and the brands of a substance). No openFDA request is made.
+
+    Args:
+        name (str): A brand, substance or generic name, possibly misspelled (e.g. 'advl')
+        limit (int): Maximum number of candidates (default: 5)
+
+    Returns:
+        List[Dict[str, Any]]: Candidates, best first, with name, score (1.0 is an exact match up
+        to case and punctuation), kind ('brand' and/or 'substance'), categories holding it and
+        synonyms (e.g. the substance of a brand)
+    """
+
+    return await _offload(name_index.resolve, name, max(1, limit))
+
+@mcp.tool()
+@metrics.timed("tool")
+async def search_cached_labels(query: str, fields: Optional[List[str]] = None, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Full-text search over the label text of drugs already saved locally (no openFDA request).
+
+    Use this to answer questions across cached drugs, e.g. which ones carry a boxed warning
+    about hepatotoxicity. All words of the query must appear in one of the searched fields.
+
+    Args:
+        query (str): Words to search for (e.g. 'hepatotoxicity')
+        fields (List[str]): Label fields to search, any of 'purpose', 'usage', 'warnings',
+            'adverse_reactions', 'boxed_warning' (default: all of them)
+        limit (int): Maximum number of drugs to return (default: 10, at most 100)
+
+    Returns:
+        List[Dict[str, Any]]: Matching drugs, best first, with category, brand_name, substance_name,
+        score and highlighted snippets of the matching fields
+    """
+
+    return await _offload(store.search_text, query, fields or TEXT_FIELDS, limit)
+
+def _category_aggregate(category: str) -> Optional[Dict[str, Any]]:
+    """Return the memoized aggregates of a category, recomputing them only if it changed since."""
+    version = store.version(category)
+    cached = _aggregates.get(category, version)
+    if cached is not None:
+        metrics.inc("aggregate_total", result="hit")
+        return cached
+    metrics.inc("aggregate_total", result="miss")
+    records = store.get_category(category)
+    if records is None:
+        return None
+    aggregate = aggregate_category(category, records)
+    _aggregates.put(category, version, aggregate)
+    return aggregate
+
+
+async def _summarize_category(
+    substance_name: str, view: Callable[[Dict[str, Any], int], Dict[str, Any]], max_items: int
+) -> Dict[str, Any]:
+    category = category_for(substance_name)
+    aggregate = await _offload(_category_aggregate, category)
+    if aggregate is None:
+        return {
+            "category": category,
+            "error": f"No saved drugs for '{substance_name}'. Search for them first using search_drug_info('{substance_name}').",
+        }
+    return view(aggregate, max(1, max_items))
+
+
+@mcp.tool()
+@metrics.timed("tool")
+async def compare_drugs_in_category(substance_name: str, max_items: int = 10) -> Dict[str, Any]:
+    """
+    Compare all saved products of a substance in one call instead of extracting them one by one.
+
+    Args:
+        substance_name (str): The substance (category) searched with search_drug_info, e.g. 'ibuprofen'
+        max_items (int): Maximum entries per list in the result (default: 10)
+
+    Returns:
+        Dict[str, Any]: Product count, products per manufacturer and per route, one row per product
+        (manufacturer, route, boxed warning, number of unique warnings), warnings shared by several
+        products and each product's unique warnings
+    """
+
+    return await _summarize_category(substance_name, comparison_view, max_items)
+
+@mcp.tool()
+@metrics.timed("tool")
+async def get_drug_safety_summary(substance_name: str, max_items: int = 10) -> Dict[str, Any]:
+    """
+    Summarize the safety profile of all saved products of a substance.
+
+    Args:
+        substance_name (str): The substance (category) searched with search_drug_info, e.g. 'ibuprofen'
+        max_items (int): Maximum entries per list in the result (default: 10)
+
+    Returns:
+        Dict[str, Any]: Boxed warnings by product, the most common warning and adverse-reaction
+        statements with the number of products carrying each, and how many labels have each section
+    """
+
+    return await _summarize_category(substance_name, safety_view, max_items)
+
+def _render_categories(categories: List[str]) -> str:
+    parts = ["# Available Drug Categories\n\n"]
+    if categories:
+        parts.append(f"**Total Categories**: {len(categories)}\n\n")
+        parts.extend(f"- **{category.replace('_', ' ').title()}**\n" for category in sorted(categories))
+        parts.append("\nUse the drug category name with other tools to access detailed information.\n")
+    else:
+        parts.append("No drug categories found. Search for drugs first using `search_drug_info()`.\n")
+    return "".join(parts)
+
+
+def _render_category(category: str, drugs_data: Dict[str, dict]) -> str:
+    parts = [
+        f"# Drugs in Category: {category.replace('_', ' ').title()}\n\n",
+        f"**Total Products**: {len(drugs_data)}\n\n",
+    ]
+    for brand_name, drug_info in drugs_data.items():
+        parts.append(
+            f"## {brand_name}\n"
+            f"- **Substance**: {drug_info['substance_name']}\n"
+            f"- **Manufacturer**: {drug_info['manufacturer']}\n"
+            f"- **Route**: {drug_info['route']}\n"
+            f"- **Purpose**: {drug_info['purpose']}\n\n"
+        )
+        # Usage section
+        if drug_info['usage'] != "Not specified":
+            parts.append(f"### Usage\n{_clip(drug_info['usage'], 300)}\n\n")
+        # Warnings section (abbreviated)
+        if drug_info['warnings'] != "Not specified":
+            parts.append(f"### Key Warnings\n{_clip(drug_info['warnings'], 200)}\n\n")
+        # Boxed warning if present
+        if drug_info['boxed_warning'] != "None":
+            parts.append(f"### ⚠️ Boxed Warning\n{_clip(drug_info['boxed_warning'], 200)}\n\n")
+        parts.append("---\n\n")
+    return "".join(parts)
+
+
+def _cached_render(uri: str, category: Optional[str], render: Callable[[], Optional[str]]) -> Optional[str]:
+    """
+    Return the memoized markdown of a resource, re-rendering only if the store changed since.
+
+    Writes through this server drop the entry right away (_category_saved); the version check
+    catches writes by other processes such as `import-dump`.
+    """
+    version = store.version(category)
+    cached = _rendered.get(uri, version)
+    if cached is not None:
+        metrics.inc("resource_render_total", result="hit")
+        return cached
+    metrics.inc("resource_render_total", result="miss")
+    content = render()
+    if content is not None:
+        _rendered.put(uri, version, content)
+    return content
+
+
+@mcp.resource(CATEGORIES_URI)
+@metrics.timed("resource")
+async def get_available_drug_categories() -> str:
     """
     List all available drug categories (substance folders) in the drugs directory.
     
     This resource provides a simple list of all available drug categories based on 
     substance names that have been searched and saved.
     """
-    categories = []
-    
-    # Get all drug directories
-    if os.path.exists(DRUG_DIR):
-        for drug_dir in os.listdir(DRUG_DIR):
-            drug_path = os.path.join(DRUG_DIR, drug_dir)
-            if os.path.isdir(drug_path):
-                drug_file = os.path.join(drug_path, "drug_info.json")
-                if os.path.exists(drug_file):
-                    categories.append(drug_dir)
-    
-    # Create a simple markdown list
-    content = "# Available Drug Categories\n\n"
-    if categories:
-        content += f"**Total Categories**: {len(categories)}\n\n"
-        for category in sorted(categories):
-            content += f"- **{category.replace('_', ' ').title()}**\n"
-        content += f"\nUse the drug category name with other tools to access detailed information.\n"
-    else:
-        content += "No drug categories found. Search for drugs first using `search_drug_info()`.\n"
-    
-    return content
+    return await _offload(
+        _cached_render, CATEGORIES_URI, None, lambda: _render_categories(store.list_categories())
+    )
+
+@mcp.resource("drugs://_cache")
+@metrics.timed("resource")
+def get_query_cache_stats() -> str:
+    """
+    Hit/miss/eviction counters of the openFDA query cache plus the client's retry,
+    single-flight and quota counters, as JSON.
+    """
+    return json.dumps({**query_cache.stats(), "openfda": get_client().stats()}, indent=2)
+
+@mcp.resource("drugs://_metrics")
+@metrics.timed("resource")
+def get_metrics_snapshot() -> str:
+    """
+    Timing histograms (p50/p99/max per tool, resource, prompt, store call and openFDA request),
+    counters (render cache hits, bytes to and from openFDA) and cache stats, as JSON.
+    """
+    return json.dumps({
+        **metrics.snapshot(),
+        "query_cache": query_cache.stats(),
+        "openfda": get_client().stats(),
+    }, indent=2)
+
+@mcp.resource("drugs://_metrics/prometheus")
+@metrics.timed("resource")
+def get_metrics_prometheus() -> str:
+    """The same metrics in the Prometheus text exposition format."""
+    gauges = {f"query_cache_{key}": value for key, value in query_cache.stats().items()}
+    gauges.update({f"openfda_{key}": value for key, value in get_client().stats().items()
+                   if isinstance(value, (int, float))})
+    return metrics.prometheus(gauges=gauges)
 
 @mcp.resource("drugs://{category}")
-def get_category_drugs(category: str) -> str:
+@metrics.timed("resource")
+async def get_category_drugs(category: str) -> str:
     """
     Get detailed information about all drugs in a specific category.
     
     Args:
         category: The drug category (substance name) to retrieve information for
     """
-    category_dir = category.lower().replace(" ", "_")
-    drug_file = os.path.join(DRUG_DIR, category_dir, "drug_info.json")
-    
-    if not os.path.exists(drug_file):
-        return f"# No drugs found for category: {category}\n\nTry searching for drugs in this category first using `search_drug_info('{category}')`."
-    
+    name = category_for(category)
+
+    def render() -> Optional[str]:
+        drugs_data = store.get_category(name)
+        return None if drugs_data is None else _render_category(name, drugs_data)
+
     try:
-        with open(drug_file, 'r', encoding='utf-8') as f:
-            drugs_data = json.load(f)
-        
-        # Create markdown content with drug details
-        content = f"# Drugs in Category: {category.replace('_', ' ').title()}\n\n"
-        content += f"**Total Products**: {len(drugs_data)}\n\n"
-        
-        for brand_name, drug_info in drugs_data.items():
-            content += f"## {brand_name}\n"
-            content += f"- **Substance**: {drug_info['substance_name']}\n"
-            content += f"- **Manufacturer**: {drug_info['manufacturer']}\n"
-            content += f"- **Route**: {drug_info['route']}\n"
-            content += f"- **Purpose**: {drug_info['purpose']}\n\n"
-            
-            # Usage section
-            if drug_info['usage'] != "Not specified":
-                content += f"### Usage\n{drug_info['usage'][:300]}{'...' if len(drug_info['usage']) > 300 else ''}\n\n"
-            
-            # Warnings section (abbreviated)
-            if drug_info['warnings'] != "Not specified":
-                content += f"### Key Warnings\n{drug_info['warnings'][:200]}{'...' if len(drug_info['warnings']) > 200 else ''}\n\n"
-            
-            # Boxed warning if present
-            if drug_info['boxed_warning'] != "None":
-                content += f"### ⚠️ Boxed Warning\n{drug_info['boxed_warning'][:200]}{'...' if len(drug_info['boxed_warning']) > 200 else ''}\n\n"
-            
-            content += "---\n\n"
-        
-        return content
+        content = await _offload(_cached_render, _category_uri(name), name, render)
     except json.JSONDecodeError:
         return f"# Error reading drug data for {category}\n\nThe drug data file is corrupted."
+    if content is None:
+        return f"# No drugs found for category: {category}\n\nTry searching for drugs in this category first using `search_drug_info('{category}')`."
+    return content
 
 @mcp.prompt()
+@metrics.timed("prompt")
 def generate_drug_research_prompt(substance_name: str, research_focus: str = "general") -> str:
     """
     Generate a comprehensive research prompt for drug analysis.
@@ -235,5 +767,160 @@ Focus Area: {instruction}
 
 Begin your analysis with the data collection steps above."""
 
+def http_app():
+    """
+    ASGI app serving the MCP server over streamable HTTP at /mcp.
+
+    A uvicorn factory (`uvicorn drugs_research:http_app --factory`); `serve --workers N` starts
+    every worker process from it.
+    """
+    return mcp.streamable_http_app()
+
+
+def _split_budget(name: str, default: float, workers: int) -> None:
+    # Each worker process has its own rate limiter, so give each an equal share of the budget
+    value = float(os.environ.get(name) or default)
+    os.environ[name] = str(max(1, int(value // workers)) if value > 0 else 0)
+
+
+def serve_http(
+    transport: str = "streamable-http",
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = 1,
+    stateless: bool = False,
+    json_response: bool = False,
+) -> None:
+    """
+    Serve many MCP clients from one long-lived server, sharing its warm caches and openFDA quota.
+
+    Args:
+        transport (str): 'streamable-http' (served at /mcp) or 'sse' (the older transport, at /sse)
+        host (str): Interface to listen on
+        port (int): Port to listen on
+        workers (int): uvicorn worker processes; more than one implies stateless mode, and each
+            worker gets an equal share of the openFDA rate and daily quota
+        stateless (bool): Handle every request on its own instead of keeping MCP sessions
+        json_response (bool): Answer with plain JSON instead of an SSE stream where possible
+    """
+    import uvicorn
+
+    if workers > 1:
+        if transport != "streamable-http":
+            raise ValueError("Several workers need the streamable-http transport")
+        # Requests are spread over processes that share no session table
+        stateless = True
+        _split_budget("OPENFDA_RATE_PER_MINUTE", OPENFDA_RATE_PER_MINUTE, workers)
+        _split_budget("OPENFDA_BURST", 40, workers)
+        has_key = bool(os.environ.get("OPENFDA_API_KEY"))
+        _split_budget("OPENFDA_DAILY_QUOTA", OPENFDA_DAILY_QUOTA_WITH_KEY if has_key else OPENFDA_DAILY_QUOTA, workers)
+
+    mcp.settings.stateless_http = stateless
+    mcp.settings.json_response = json_response
+    if workers > 1:
+        # Worker processes import this module afresh and read FastMCP settings from FASTMCP_*
+        os.environ["FASTMCP_STATELESS_HTTP"] = "true"
+        os.environ["FASTMCP_JSON_RESPONSE"] = str(json_response).lower()
+        uvicorn.run(
+            "drugs_research:http_app",
+            factory=True,
+            host=host,
+            port=port,
+            workers=workers,
+            app_dir=os.path.dirname(os.path.abspath(__file__)),
+        )
+    elif transport == "sse":
+        uvicorn.run(mcp.sse_app(), host=host, port=port)
+    else:
+        uvicorn.run(http_app(), host=host, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="drugs-research", description="Drug research MCP server")
+    parser.set_defaults(transport="stdio", host="127.0.0.1", port=8000, workers=1, stateless=False, json_response=False)
+    subcommands = parser.add_subparsers(dest="command")
+    serve = subcommands.add_parser("serve", help="Run the MCP server (default: over stdio)")
+    serve.add_argument("--transport", choices=("stdio", "streamable-http", "sse"), default="stdio",
+                       help="stdio for one client that spawns the server; streamable-http or sse to serve many clients")
+    serve.add_argument("--host", default="127.0.0.1", help="HTTP interface to listen on")
+    serve.add_argument("--port", type=int, default=8000, help="HTTP port to listen on")
+    serve.add_argument("--workers", type=int, default=1, help="HTTP worker processes (more than one implies --stateless)")
+    serve.add_argument("--stateless", action="store_true", help="Do not keep MCP sessions between HTTP requests")
+    serve.add_argument("--json-response", action="store_true", help="Answer with JSON instead of SSE streams where possible")
+    migrate = subcommands.add_parser("migrate", help="Copy the drugs/<category>/drug_info.json folders into the SQLite store")
+    migrate.add_argument("--source", default=DRUG_DIR, help=f"Folder layout to read (default: {DRUG_DIR})")
+    ingest = subcommands.add_parser("ingest", help="Stream every openFDA label of a drug into the store (resumable)")
+    ingest.add_argument("drug_name", help="Brand or substance name, e.g. ibuprofen")
+    ingest.add_argument("--page-size", type=int, default=100, help="Labels per request (max 1000)")
+    ingest.add_argument("--max-records", type=int, default=None, help="Stop after about this many labels")
+    ingest.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    import_dump = subcommands.add_parser("import-dump", help="Load openFDA bulk label zip partitions into the SQLite store")
+    import_dump.add_argument("zip_paths", nargs="+", help="drug-label-*.json.zip files")
+    import_dump.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per partition, up to the CPU count)")
+    import_dump.add_argument("--batch-size", type=int, default=500, help="Labels written per transaction")
+    args = parser.parse_args()
+
+    if args.command == "import-dump":
+        if not isinstance(store, SQLiteStore):
+            parser.error("import-dump needs the sqlite backend (DRUG_STORE=sqlite)")
+        from bulk_import import import_dump as run_import
+        summary = run_import(args.zip_paths, store.path, workers=args.workers, batch_size=args.batch_size)
+        print(json.dumps(summary, indent=2))
+        return
+
+    if args.command == "ingest":
+        summary = asyncio.run(ingest_drug(
+            args.drug_name,
+            page_size=args.page_size,
+            max_records=args.max_records,
+            restart=args.restart,
+            progress=print,
+        ))
+        print(json.dumps(summary, indent=2))
+        return
+
+    if args.command == "migrate":
+        if not isinstance(store, SQLiteStore):
+            parser.error("migrate needs the sqlite backend (DRUG_STORE=sqlite)")
+        migrated = migrate_json_dir(args.source, store)
+        print(f"Migrated {migrated} drug records from {args.source} into {store.path}")
+        return
+
+    if args.workers > 1 and not isinstance(store, SQLiteStore):
+        parser.error("--workers needs the sqlite backend (DRUG_STORE=sqlite), which is safe across processes")
+    if args.workers > 1 and args.transport != "streamable-http":
+        parser.error("--workers needs --transport streamable-http")
+
+    # DRUG_PROFILE=cprofile|sample profiles the whole run; SIGUSR1 starts/stops a capture at any time.
+    # Messages go to stderr because stdout carries the stdio transport.
+    profile_mode = os.environ.get("DRUG_PROFILE", "")
+    profiler = Profiler(profile_mode or "cprofile", os.environ.get("DRUG_PROFILE_DIR", os.path.join(DRUG_DIR, ".profiles")))
+    if profile_mode:
+        profiler.start()
+    if hasattr(signal, "SIGUSR1"):
+        def toggle_profiler(signum, frame):
+            path = profiler.toggle()
+            print(f"Profile written to {path}" if path else f"Profiling ({profiler.mode}) started", file=sys.stderr)
+        signal.signal(signal.SIGUSR1, toggle_profiler)
+    # Clients usually terminate stdio servers; exit normally so a running capture is still written
+    # (uvicorn installs its own handlers for the HTTP transports)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Build lookup indexes while the client is still connecting instead of on the first tool call
+    store.warm()
+    name_index.warm()
+    try:
+        if args.transport == "stdio":
+            mcp.run(transport='stdio')
+        else:
+            serve_http(args.transport, args.host, args.port, args.workers, args.stateless, args.json_response)
+    finally:
+        path = profiler.stop()
+        if path:
+            print(f"Profile written to {path}", file=sys.stderr)
+        # Persists the json store's brand index snapshot so the next start skips the rebuild
+        store.close()
+
+
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,154 +1,472 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from contextlib import AsyncExitStack
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+import anyio
+import argparse
 import json
+import os
+import sys
+import time
 import asyncio
-import nest_asyncio
 
-nest_asyncio.apply()
+from metrics import percentile
 
 load_dotenv()
 
+# Prompt-cache breakpoint marker for the Messages API
+CACHE_CONTROL = {"type": "ephemeral"}
+# Characters of an older tool result kept when the conversation is compacted
+COMPACTED_RESULT_CHARS = 500
+# Token counters summed over the turns of a query in batch results
+USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+
+
+def load_queries(path, field="query", id_field="id"):
+    """
+    Read batch queries from a JSONL file.
+
+    Each line is either a JSON object with the query text under `field` (and optionally an id
+    under `id_field`) or plain text. Blank lines are skipped; lines without an id are numbered.
+
+    Returns:
+        list: (query_id, query) tuples in file order
+    """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = line
+            if isinstance(entry, dict):
+                if field not in entry:
+                    print(f"Skipping line {number} of {path}: no '{field}' field")
+                    continue
+                queries.append((str(entry.get(id_field, number)), str(entry[field])))
+            else:
+                queries.append((str(number), str(entry)))
+    return queries
+
+
+def connection_lost(error):
+    """Whether an MCP request failed because the server connection is gone."""
+    if isinstance(error, McpError):
+        return error.error.code == CONNECTION_CLOSED
+    return isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream))
+
+
 class MCP_ChatBot:
-    def __init__(self):
-        self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+    def __init__(self, anthropic=None):
+        # Any object with the AsyncAnthropic `messages.stream` interface, e.g. a mock in tests
+        self.anthropic = anthropic or AsyncAnthropic()
         # Tools list required for Anthropic API
         self.available_tools = []
         # Prompts list for quick display 
         self.available_prompts = []
         # Sessions dict maps tool/prompt names or resource URIs to MCP client sessions
         self.sessions = {}
+        # Seconds a single tool call may take before its result is reported as an error
+        self.tool_timeout = float(os.environ.get("MCP_TOOL_TIMEOUT", "120"))
+        # Server name -> config, readiness future, session, close event and the task owning its connection
+        self.servers = {}
+        # Seconds to wait for servers at startup (slower ones keep starting in the background)
+        self.connect_timeout = float(os.environ.get("MCP_CONNECT_TIMEOUT", "30"))
+        # Minimum seconds between restarts of a failed server
+        self.retry_interval = float(os.environ.get("MCP_RETRY_INTERVAL", "30"))
+        # Estimated conversation tokens above which older tool results are truncated
+        self.context_budget = int(os.environ.get("MCP_CONTEXT_BUDGET", "60000"))
+
+    async def register_capabilities(self, server_name, session, capabilities):
+        """List a server's tools, prompts and resources concurrently and map them to its session."""
+        listings = {}
+        if capabilities is None or capabilities.tools:
+            listings["tools"] = session.list_tools()
+        if capabilities is None or capabilities.prompts:
+            listings["prompts"] = session.list_prompts()
+        if capabilities is None or capabilities.resources:
+            listings["resources"] = session.list_resources()
+        responses = dict(zip(listings, await asyncio.gather(*listings.values(), return_exceptions=True)))
 
-    async def connect_to_server(self, server_name, server_config):
+        for kind, response in responses.items():
+            if isinstance(response, Exception):
+                print(f"Error listing {kind} of {server_name}: {response}")
+                responses[kind] = None
+
+        # List available tools
+        if responses.get("tools"):
+            for tool in responses["tools"].tools:
+                self.sessions[tool.name] = session
+                self.available_tools.append({
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema
+                })
+
+        # List available prompts
+        if responses.get("prompts") and responses["prompts"].prompts:
+            for prompt in responses["prompts"].prompts:
+                self.sessions[prompt.name] = session
+                self.available_prompts.append({
+                    "name": prompt.name,
+                    "description": prompt.description,
+                    "arguments": prompt.arguments
+                })
+
+        # List available resources
+        if responses.get("resources") and responses["resources"].resources:
+            for resource in responses["resources"].resources:
+                resource_uri = str(resource.uri)
+                self.sessions[resource_uri] = session
+
+    async def run_server(self, server_name, server):
+        """
+        Own one server connection until its "closed" event is set.
+
+        The transport and session are entered and exited inside this task (anyio requires that),
+        so every server runs in its own task and can start independently of the others. A config
+        with a "url" connects to an already running streamable-HTTP server; otherwise the server
+        is spawned over stdio. server["ready"] resolves with the startup time once capabilities are
+        registered.
+        """
+        server_config, ready = server["config"], server["ready"]
+        start = time.perf_counter()
         try:
-            server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            )
-            await session.initialize()
-            
-            try:
-                # List available tools
-                response = await session.list_tools()
-                for tool in response.tools:
-                    self.sessions[tool.name] = session
-                    self.available_tools.append({
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema
-                    })
-            
-                # List available prompts
-                prompts_response = await session.list_prompts()
-                if prompts_response and prompts_response.prompts:
-                    for prompt in prompts_response.prompts:
-                        self.sessions[prompt.name] = session
-                        self.available_prompts.append({
-                            "name": prompt.name,
-                            "description": prompt.description,
-                            "arguments": prompt.arguments
-                        })
-                        
-                # List available resources
-                resources_response = await session.list_resources()
-                if resources_response and resources_response.resources:
-                    for resource in resources_response.resources:
-                        resource_uri = str(resource.uri)
-                        self.sessions[resource_uri] = session
-            
-            except Exception as e:
-                print(f"Error listing server capabilities: {e}")
-                
+            if "url" in server_config:
+                transport = streamablehttp_client(server_config["url"], headers=server_config.get("headers"))
+            else:
+                transport = stdio_client(StdioServerParameters(**server_config))
+            async with transport as (read, write, *_):
+                async with ClientSession(read, write) as session:
+                    init = await session.initialize()
+                    server["session"] = session
+                    await self.register_capabilities(server_name, session, init.capabilities)
+                    ready.set_result(time.perf_counter() - start)
+                    await server["closed"].wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Connection to {server_name} closed: {e}")
+                if not server["closed"].is_set():
+                    self.drop_session(server["session"])
+
+    def connect_to_server(self, server_name, server_config):
+        """Start a server in the background and return the future that resolves when it is ready."""
+        ready = asyncio.get_running_loop().create_future()
+        # Consume the exception so a failure is not reported again as "never retrieved"
+        ready.add_done_callback(lambda f: f.cancelled() or f.exception())
+        server = self.servers[server_name] = {
+            "config": server_config,
+            "ready": ready,
+            "session": None,
+            "closed": asyncio.Event(),
+            "started": time.monotonic(),
+        }
+        server["task"] = asyncio.create_task(self.run_server(server_name, server))
+        return ready
+
+    def drop_session(self, session):
+        """
+        Forget a server session whose connection has died and restart its server.
+
+        The session's tools, prompts and resources are unregistered at once, so the model is not
+        offered tools that can only fail; they come back when the restarted server is ready.
+        """
+        names = {name for name, owner in self.sessions.items() if owner is session}
+        for name in names:
+            del self.sessions[name]
+        self.available_tools = [tool for tool in self.available_tools if tool["name"] not in names]
+        self.available_prompts = [prompt for prompt in self.available_prompts if prompt["name"] not in names]
+
+        for server_name, server in list(self.servers.items()):
+            if server["session"] is session and not server["closed"].is_set():
+                server["closed"].set()
+                print(f"Lost connection to {server_name}, restarting it...")
+                self.connect_to_server(server_name, server["config"])
+
+    async def request(self, name, session, call):
+        """
+        Send `call(session)`, a request for the tool, prompt or resource `name`.
+
+        If the request fails because the connection is gone, the session is dropped (see
+        drop_session). A request that never reached the server is then sent once more to the
+        restarted server; one that may have been running when the server died is not repeated.
+        """
+        try:
+            return await call(session)
         except Exception as e:
-            print(f"Error connecting to {server_name}: {e}")
+            if not connection_lost(e):
+                raise
+            self.drop_session(session)
+            if isinstance(e, McpError):
+                raise
+            retry_session = await self.get_session(name)
+            if retry_session is None:
+                raise
+            return await call(retry_session)
+
+    async def wait_for_server(self, server_name, timeout):
+        """Wait up to `timeout` seconds for a server; returns (status, detail) for reporting."""
+        ready = self.servers[server_name]["ready"]
+        try:
+            elapsed = await asyncio.wait_for(asyncio.shield(ready), timeout=timeout)
+            return "ready", f"{elapsed:.2f}s"
+        except asyncio.TimeoutError:
+            return "starting", f"not ready after {timeout:g}s, continuing in the background"
+        except Exception as e:
+            return "failed", str(e) or type(e).__name__
 
     async def connect_to_servers(self):
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
             servers = data.get("mcpServers", {})
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
         except Exception as e:
             print(f"Error loading server config: {e}")
             raise
-    
-    async def process_query(self, query):
+
+        # Launch every server at once; a slow or broken one does not hold up the others
+        for server_name, server_config in servers.items():
+            self.connect_to_server(server_name, server_config)
+        statuses = await asyncio.gather(*(
+            self.wait_for_server(server_name, self.connect_timeout) for server_name in servers
+        ))
+
+        print("Server startup:")
+        for server_name, (status, detail) in zip(servers, statuses):
+            print(f"  {server_name}: {status} ({detail})")
+
+    async def recover_servers(self):
+        """
+        Give servers that are still starting, or that failed, another chance.
+
+        Called when a tool, prompt or resource is not found: pending servers are awaited and
+        failed ones restarted (at most once per MCP_RETRY_INTERVAL seconds), all concurrently.
+        """
+        waits = []
+        for server_name, server in list(self.servers.items()):
+            ready = server["ready"]
+            if ready.done() and not ready.cancelled() and ready.exception() is not None:
+                if time.monotonic() - server["started"] < self.retry_interval:
+                    continue
+                print(f"Retrying server {server_name}...")
+                self.connect_to_server(server_name, server["config"])
+            elif ready.done():
+                continue
+            waits.append(server_name)
+
+        statuses = await asyncio.gather(*(
+            self.wait_for_server(server_name, self.connect_timeout) for server_name in waits
+        ))
+        for server_name, (status, detail) in zip(waits, statuses):
+            print(f"  {server_name}: {status} ({detail})")
+
+    async def get_session(self, name):
+        """Find the session for a tool/prompt name or resource URI, recovering servers if needed."""
+        session = self.sessions.get(name)
+        if not session and self.servers:
+            await self.recover_servers()
+            session = self.sessions.get(name)
+        return session
+
+    async def call_tool(self, tool_use):
+        """Run one tool_use block and return its tool_result block."""
+        session = await self.get_session(tool_use.name)
+        if not session:
+            print(f"Tool '{tool_use.name}' not found.")
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": f"Error: Tool '{tool_use.name}' not available",
+                "is_error": True
+            }
+
+        try:
+            result = await asyncio.wait_for(
+                self.request(tool_use.name, session, lambda s: s.call_tool(tool_use.name, arguments=tool_use.input)),
+                timeout=self.tool_timeout
+            )
+            tool_result = {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": result.content
+            }
+            if result.isError:
+                tool_result["is_error"] = True
+            return tool_result
+        except asyncio.TimeoutError:
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": f"Tool execution error: '{tool_use.name}' timed out after {self.tool_timeout:g}s",
+                "is_error": True
+            }
+        except Exception as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": f"Tool execution error: {str(e) or type(e).__name__}",
+                "is_error": True
+            }
+
+    def request_tools(self):
+        """Tool definitions with a cache breakpoint on the last one, so the whole list is cached."""
+        if not self.available_tools:
+            return []
+        return self.available_tools[:-1] + [{**self.available_tools[-1], "cache_control": CACHE_CONTROL}]
+
+    @staticmethod
+    def request_messages(messages):
+        """
+        Messages with a rolling cache breakpoint on the newest block.
+
+        Everything before it (the conversation so far) is the stable prefix; the previous turn's
+        breakpoint is found again by the API's cache lookback. Stored messages are left untouched
+        so breakpoints never pile up.
+        """
+        last = messages[-1]
+        content = last['content']
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        content = list(content[:-1]) + [{**content[-1], "cache_control": CACHE_CONTROL}]
+        return messages[:-1] + [{**last, 'content': content}]
+
+    def compact_messages(self, messages):
+        """
+        Truncate older tool results once the conversation exceeds the token budget.
+
+        Tokens are estimated at ~4 characters each. Results are shortened oldest first, keeping
+        the newest tool results intact, until the estimate is back under half the budget so the
+        (cache-invalidating) compaction does not happen again on the very next turn.
+        """
+        def size(content):
+            if isinstance(content, str):
+                return len(content)
+            return sum(len(getattr(item, 'text', None) or str(item)) for item in content)
+
+        def tokens():
+            total = 0
+            for message in messages:
+                if isinstance(message['content'], str):
+                    total += len(message['content'])
+                    continue
+                for block in message['content']:
+                    if isinstance(block, dict) and block.get('type') == 'tool_result':
+                        total += size(block['content'])
+                    else:
+                        total += len(str(block))
+            return total // 4
+
+        if tokens() <= self.context_budget:
+            return
+        # The last message holds the newest tool results, which the model has not seen yet
+        for message in messages[:-1]:
+            if message['role'] != 'user' or isinstance(message['content'], str):
+                continue
+            for block in message['content']:
+                if not isinstance(block, dict) or block.get('type') != 'tool_result':
+                    continue
+                content = block['content']
+                if size(content) <= COMPACTED_RESULT_CHARS:
+                    continue
+                text = content if isinstance(content, str) else "\n".join(
+                    getattr(item, 'text', None) or str(item) for item in content
+                )
+                block['content'] = (
+                    f"{text[:COMPACTED_RESULT_CHARS]}\n"
+                    f"[... {len(text) - COMPACTED_RESULT_CHARS} characters of this earlier tool result were removed to save context]"
+                )
+                if tokens() <= self.context_budget // 2:
+                    return
+
+    async def process_query(self, query, on_text=None):
+        """
+        Run one query through the model/tool loop, streaming text as it arrives.
+
+        Text is printed unless `on_text` is given; it is then called with every text chunk instead
+        and the per-turn stats line is not printed either (batch runs keep stdout readable).
+
+        Returns a list with per-turn stats: time to first token, end-to-end latency (model
+        response plus the tools it requested) and token usage (input, cache write/read, output).
+        """
         messages = [{'role':'user', 'content':query}]
+        turn_stats = []
         
         while True:
-            response = self.anthropic.messages.create(
-                max_tokens = 2024,
-                model = 'claude-3-7-sonnet-20250219', 
-                tools = self.available_tools,
-                messages = messages
-            )
+            start = time.perf_counter()
+            first_token = None
+            tool_tasks = []
+            self.compact_messages(messages)
+            try:
+                async with self.anthropic.messages.stream(
+                    max_tokens = 2024,
+                    model = 'claude-3-7-sonnet-20250219', 
+                    tools = self.request_tools(),
+                    messages = self.request_messages(messages)
+                ) as stream:
+                    async for event in stream:
+                        if event.type in ('text', 'input_json') and first_token is None:
+                            first_token = time.perf_counter() - start
+                        if event.type == 'text':
+                            if on_text:
+                                on_text(event.text)
+                            else:
+                                print(event.text, end='', flush=True)
+                        elif event.type == 'content_block_stop':
+                            if event.content_block.type == 'text':
+                                if on_text:
+                                    on_text("\n")
+                                else:
+                                    print()
+                            elif event.content_block.type == 'tool_use':
+                                # The tool input is complete: start it while the rest of the response streams
+                                tool_tasks.append(asyncio.create_task(self.call_tool(event.content_block)))
+                    response = await stream.get_final_message()
+            except BaseException:
+                for task in tool_tasks:
+                    task.cancel()
+                raise
             
-            assistant_content = []
-            has_tool_use = False
+            # One assistant message carries the text and every tool_use block of this turn
+            messages.append({'role':'assistant', 'content':response.content})
             
-            for content in response.content:
-                if content.type == 'text':
-                    print(content.text)
-                    assistant_content.append(content)
-                elif content.type == 'tool_use':
-                    has_tool_use = True
-                    assistant_content.append(content)
-                    
-                    # Get session and call tool
-                    session = self.sessions.get(content.name)
-                    if not session:
-                        print(f"Tool '{content.name}' not found.")
-                        tool_result = {
-                            "type": "tool_result",
-                            "tool_use_id": content.id,
-                            "content": f"Error: Tool '{content.name}' not available",
-                            "is_error": True
-                        }
-                    else:
-                        try:
-                            result = await session.call_tool(content.name, arguments=content.input)
-                            tool_result = {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": result.content
-                            }
-                        except Exception as e:
-                            tool_result = {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": f"Tool execution error: {str(e)}",
-                                "is_error": True
-                            }
-                    
-                    # Add assistant message with tool use
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    
-                    # Add tool result
-                    messages.append({
-                        "role": "user", 
-                        "content": [tool_result]
-                    })
-                    
-                    # Reset for next iteration
-                    assistant_content = []
+            # Wait for all tools of the turn and answer them in a single user message
+            if tool_tasks:
+                tool_results = await asyncio.gather(*tool_tasks)
+                messages.append({'role':'user', 'content':list(tool_results)})
+            
+            usage = response.usage
+            stats = {
+                "time_to_first_token": round(first_token if first_token is not None else time.perf_counter() - start, 3),
+                "latency": round(time.perf_counter() - start, 3),
+                "tool_calls": len(tool_tasks),
+                "input_tokens": usage.input_tokens,
+                "cache_creation_input_tokens": usage.cache_creation_input_tokens or 0,
+                "cache_read_input_tokens": usage.cache_read_input_tokens or 0,
+                "output_tokens": usage.output_tokens,
+            }
+            turn_stats.append(stats)
+            if not on_text:
+                print(f"[turn {len(turn_stats)}] first token {stats['time_to_first_token']:.2f}s, "
+                      f"end-to-end {stats['latency']:.2f}s, {stats['tool_calls']} tool call(s), "
+                      f"tokens in {stats['input_tokens']} + cache write {stats['cache_creation_input_tokens']} "
+                      f"+ cache read {stats['cache_read_input_tokens']}, out {stats['output_tokens']}")
             
             # Exit loop if no tool was used
-            if not has_tool_use:
-                # Add final assistant message if there was text content
-                if assistant_content:
-                    messages.append({'role':'assistant', 'content':assistant_content})
+            if not tool_tasks:
                 break
+        
+        return turn_stats
 
     async def get_resource(self, resource_uri):
-        session = self.sessions.get(resource_uri)
+        session = await self.get_session(resource_uri)
         
         # Fallback for drugs URIs - try any drugs resource session
         if not session and resource_uri.startswith("drugs://"):
@@ -162,7 +480,7 @@ class MCP_ChatBot:
             return
         
         try:
-            result = await session.read_resource(uri=resource_uri)
+            result = await self.request(resource_uri, session, lambda s: s.read_resource(uri=resource_uri))
             if result and result.contents:
                 print(f"\nResource: {resource_uri}")
                 print("Content:")
@@ -200,13 +518,13 @@ class MCP_ChatBot:
     
     async def execute_prompt(self, prompt_name, args):
         """Execute a prompt with the given arguments."""
-        session = self.sessions.get(prompt_name)
+        session = await self.get_session(prompt_name)
         if not session:
             print(f"Prompt '{prompt_name}' not found.")
             return
         
         try:
-            result = await session.get_prompt(prompt_name, arguments=args)
+            result = await self.request(prompt_name, session, lambda s: s.get_prompt(prompt_name, arguments=args))
             if result and result.messages:
                 prompt_content = result.messages[0].content
                 
@@ -225,6 +543,100 @@ class MCP_ChatBot:
         except Exception as e:
             print(f"Error executing prompt: {e}")
     
+    async def run_one(self, query_id, query, timeout):
+        """Run one batch query and return its JSONL result record."""
+        parts = []
+        start = time.perf_counter()
+        record = {"id": query_id, "query": query}
+        try:
+            turns = await asyncio.wait_for(self.process_query(query, on_text=parts.append), timeout=timeout)
+            record["status"] = "ok"
+        except asyncio.TimeoutError:
+            turns = []
+            record.update(status="timeout", error=f"Query timed out after {timeout:g}s")
+        except Exception as e:
+            turns = []
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record.update({
+            "answer": "".join(parts).strip(),
+            "latency": round(time.perf_counter() - start, 3),
+            "turns": len(turns),
+            "tool_calls": sum(turn["tool_calls"] for turn in turns),
+            **{field: sum(turn[field] for turn in turns) for field in USAGE_FIELDS},
+            "turn_stats": turns,
+        })
+        return record
+
+    async def run_batch(self, queries, out_path, concurrency=4, timeout=300.0, resume=False):
+        """
+        Run many queries concurrently over the already connected server sessions.
+
+        At most `concurrency` conversations run at once and each is cancelled after `timeout`
+        seconds. One JSON result per query (answer, status, latency, turns, tool calls, token usage
+        and per-turn stats) is appended to `out_path` as soon as it finishes, so a long run can be
+        followed with `tail -f` and nothing is lost if it is interrupted.
+
+        Args:
+            queries (list): (query_id, query) tuples, e.g. from load_queries
+            out_path (str): JSONL file the results are appended to
+            concurrency (int): Conversations in flight at once
+            timeout (float): Seconds one query (all of its turns and tool calls) may take
+            resume (bool): Skip queries whose id already has a result in `out_path`
+
+        Returns:
+            dict: Counts by status, wall time, throughput, p50/p99 latency and token totals
+        """
+        done = set()
+        if resume and os.path.exists(out_path):
+            with open(out_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["id"])
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue
+        pending = [(query_id, query) for query_id, query in queries if query_id not in done]
+        if done:
+            print(f"Resuming: {len(queries) - len(pending)} of {len(queries)} queries already have results")
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        records = []
+        start = time.perf_counter()
+
+        async def run(query_id, query):
+            async with semaphore:
+                return await self.run_one(query_id, query, timeout)
+
+        with open(out_path, "a", encoding="utf-8") as out:
+            tasks = [asyncio.create_task(run(query_id, query)) for query_id, query in pending]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    record = await finished
+                    out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    out.flush()
+                    records.append(record)
+                    print(f"[{len(records)}/{len(pending)}] {record['id']}: {record['status']} "
+                          f"in {record['latency']:.2f}s, {record['tool_calls']} tool call(s)", file=sys.stderr)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        elapsed = time.perf_counter() - start
+        latencies = [record["latency"] for record in records]
+        statuses = {}
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        return {
+            "queries": len(records),
+            "skipped": len(queries) - len(pending),
+            "statuses": statuses,
+            "seconds": round(elapsed, 2),
+            "queries_per_minute": round(len(records) / elapsed * 60, 1) if elapsed else 0.0,
+            "latency_p50": round(percentile(latencies, 50), 3),
+            "latency_p99": round(percentile(latencies, 99), 3),
+            "tool_calls": sum(record["tool_calls"] for record in records),
+            **{field: sum(record[field] for record in records) for field in USAGE_FIELDS},
+        }
+
     async def chat_loop(self):
         print("\nMCP Drug Research Chatbot Started!")
         print("Available commands:")
@@ -298,19 +710,38 @@ class MCP_ChatBot:
     
     async def cleanup(self):
         """Clean up all connections."""
-        try:
-            await self.exit_stack.aclose()
-        except Exception as e:
-            print(f"Cleanup error: {e}")
+        for server in self.servers.values():
+            server["closed"].set()
+        results = await asyncio.gather(
+            *(server["task"] for server in self.servers.values()), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Cleanup error: {result}")
 
 
 async def main():
+    parser = argparse.ArgumentParser(description="MCP drug research chatbot")
+    parser.add_argument("--batch", metavar="QUERIES_JSONL", help="Run the queries of a JSONL file instead of chatting")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL file batch results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch conversations in flight at once")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds one batch query may take")
+    parser.add_argument("--field", default="query", help="Field of each JSONL object holding the query")
+    parser.add_argument("--id-field", default="id", help="Field of each JSONL object holding its id")
+    parser.add_argument("--resume", action="store_true", help="Skip queries that already have a result in --out")
+    args = parser.parse_args()
+
     chatbot = MCP_ChatBot()
     try:
         print("Connecting to MCP servers...")
         await chatbot.connect_to_servers()
         print("Connected successfully!")
-        await chatbot.chat_loop()
+        if args.batch:
+            queries = load_queries(args.batch, args.field, args.id_field)
+            summary = await chatbot.run_batch(queries, args.out, args.concurrency, args.timeout, args.resume)
+            print(json.dumps(summary, indent=2))
+        else:
+            await chatbot.chat_loop()
     except KeyboardInterrupt:
         print("\n\nGoodbye!")
     except Exception as e:
@@ -0,0 +1,299 @@
+"""
+In-process metrics and profiling for the research server.
+
+Handlers are timed into fixed-bucket histograms (the Prometheus layout), events are counted, and
+everything can be read back as a JSON-friendly snapshot or as Prometheus text. A Profiler wraps
+cProfile and a small stack sampler so traces can be captured from a server under load.
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Histogram upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with count, sum and max."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the largest value seen."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of named, labelled histograms and counters.
+
+    Names follow Prometheus conventions (`*_seconds` for histograms, `*_total` for counters).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.started = time.time()
+
+    def observe(self, metric: str, seconds: float, **labels: Any) -> None:
+        """Record one duration in the `metric` histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, metric: str, amount: float = 1, **labels: Any) -> None:
+        """Add `amount` to the `metric` counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, metric: str, **labels: Any) -> Iterator[None]:
+        """Time the body of a with-block into the `metric` histogram, labelled with its outcome."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe(metric, time.perf_counter() - start, **labels, status=status)
+
+    def timed(self, kind: str) -> Callable[[Callable], Callable]:
+        """
+        Decorator timing an MCP handler into `handler_seconds{kind, name, status}`.
+
+        The wrapper keeps the handler's signature (FastMCP builds the tool schema from it) and
+        stays a coroutine function for async handlers.
+        """
+        def decorate(fn: Callable) -> Callable:
+            labels = {"kind": kind, "name": fn.__name__}
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer("handler_seconds", **labels):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer("handler_seconds", **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Histogram summaries and counter values, grouped by metric name."""
+        def label_text(key: LabelKey) -> str:
+            return ",".join(f"{k}={v}" for k, v in key) or "total"
+
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "histograms": {
+                    name: {label_text(key): histogram.summary() for key, histogram in series.items()}
+                    for name, series in self._histograms.items()
+                },
+                "counters": {
+                    name: {label_text(key): value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+            }
+
+    def prometheus(self, prefix: str = "drugs_", gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): Prepended to every metric name
+            gauges (Optional[Dict[str, float]]): Extra point-in-time values to export, e.g. cache sizes
+        """
+        def labels_text(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = key + extra
+            if not pairs:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{prefix}{name}_bucket{labels_text(key, (('le', le),))} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{labels_text(key)} {histogram.sum}")
+                    lines.append(f"{prefix}{name}_count{labels_text(key)} {histogram.count}")
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for key, value in series.items():
+                    lines.append(f"{prefix}{name}{labels_text(key)} {value}")
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            lines.append(f"{prefix}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    On-demand profiler writing one trace file per capture.
+
+    'cprofile' records the event-loop thread with cProfile (a .prof file for pstats/snakeviz);
+    'sample' snapshots the stacks of every thread, including the worker threads running store
+    calls, every `interval` seconds and writes them in the folded format flame graph tools read.
+
+    Args:
+        mode (str): 'cprofile' or 'sample'
+        out_dir (str): Directory the trace files are written to
+        interval (float): Seconds between stack samples in 'sample' mode
+    """
+
+    def __init__(self, mode: str, out_dir: str, interval: float = 0.005):
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profiler mode: {mode} (use 'cprofile' or 'sample')")
+        self.mode = mode
+        self.out_dir = out_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profile: Optional[Any] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stacks: Dict[str, int] = {}
+        self._captures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None or self._sampler is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            if self.mode == "cprofile":
+                # Imported here so servers that never profile do not pay for it at startup
+                import cProfile
+
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                self._stacks = {}
+                self._stop.clear()
+                self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+                self._sampler.start()
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                self._stacks[folded] = self._stacks.get(folded, 0) + 1
+
+    def stop(self) -> Optional[str]:
+        """Stop capturing and write the trace; returns its path (None if nothing was running)."""
+        with self._lock:
+            if not self.running:
+                return None
+            os.makedirs(self.out_dir, exist_ok=True)
+            self._captures += 1
+            stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._captures}"
+            if self._profile is not None:
+                self._profile.disable()
+                path = os.path.join(self.out_dir, f"profile-{stamp}.prof")
+                self._profile.dump_stats(path)
+                self._profile = None
+            else:
+                self._stop.set()
+                self._sampler.join()
+                self._sampler = None
+                path = os.path.join(self.out_dir, f"profile-{stamp}.folded")
+                with open(path, "w", encoding="utf-8") as f:
+                    for stack, count in sorted(self._stacks.items()):
+                        f.write(f"{stack} {count}\n")
+            return path
+
+    def toggle(self) -> Optional[str]:
+        """Start a capture, or stop the running one and return the path of its trace."""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
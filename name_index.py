@@ -0,0 +1,245 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from drug_store import DrugStore, normalize_drug_name
+
+# Names with a similarity below this are not offered as candidates
+MIN_SCORE = 0.5
+# A misspelled name is replaced by its best candidate only from this similarity up: one typo in a
+# name of seven or more letters, while 'prednisolone' (0.83 from 'prednisone') falls short
+ACCEPT_SCORE = 0.85
+# Names sharing the most trigrams with a query that are scored by edit distance
+SHORTLIST_SIZE = 20
+# Postings scanned per fuzzy lookup: a query's rarest trigrams are used until this many names were
+# seen, so trigrams most names contain (' br', 'and') do not turn a lookup into a full scan
+MAX_POSTINGS = 5000
+# Synonyms reported per candidate
+MAX_SYNONYMS = 10
+# Minimum seconds between checks of the store for writes by other processes
+VERSION_CHECK_INTERVAL = 5.0
+
+
+def trigrams(key: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded like pg_trgm so word starts weigh more."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str, min_score: float = 0.0) -> float:
+    """
+    1 - Levenshtein distance / length of the longer string (1.0 for equal strings).
+
+    Gives up early and returns 0.0 once the result can no longer reach `min_score`.
+    """
+    if a == b:
+        return 1.0
+    if len(a) < len(b):
+        a, b = b, a
+    max_distance = int((1 - min_score) * len(a))
+    if len(a) - len(b) > max_distance:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return 0.0
+        previous = current
+    return 1 - previous[-1] / len(a)
+
+
+class _Name:
+    __slots__ = ("name", "key", "kinds", "categories", "synonyms", "grams")
+
+    def __init__(self, name: str, key: str):
+        self.name = name
+        self.key = key
+        self.kinds: Set[str] = set()
+        self.categories: Set[str] = set()
+        self.synonyms: Dict[str, str] = {}
+        self.grams = trigrams(key)
+
+
+class NameIndex:
+    """
+    Local drug name resolution: exact, case-insensitive, misspelled and brand <-> substance names.
+
+    Every saved brand and substance name (plus the generic and alternative brand names of labels
+    fetched by this process) is indexed under its normalized key and its character trigrams. A
+    known name resolves with one dict lookup. For anything else the names sharing the most
+    trigrams with it are shortlisted and ranked by edit-distance similarity, which, unlike trigram
+    overlap, scores a one-letter typo in a short name ('advl') highly. Each candidate carries its
+    synonyms, e.g. the substance of a brand, and the categories holding it.
+
+    The index is built from the store on first use and rebuilt when the store is written behind
+    its back (e.g. `import-dump`), which is checked at most every `check_interval` seconds; writes
+    through this process call `add` directly. All methods are thread-safe.
+
+    Args:
+        store (DrugStore): Drug store the index is built from
+        check_interval (float): Minimum seconds between checks of store.data_version()
+    """
+
+    def __init__(self, store: DrugStore, check_interval: float = VERSION_CHECK_INTERVAL):
+        self.store = store
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._names: Dict[str, _Name] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        # store.data_version() the index is up to date with; None until it was built
+        self._version: Optional[tuple] = None
+        # time.monotonic() of the last version check
+        self._checked = 0.0
+        self._built = False
+
+    def _entry(self, name: str) -> Optional[_Name]:
+        if not name or name in ("Unknown", "Not specified"):
+            return None
+        key = normalize_drug_name(name)
+        if not key:
+            return None
+        entry = self._names.get(key)
+        if entry is None:
+            entry = self._names[key] = _Name(name, key)
+            for gram in entry.grams:
+                self._postings.setdefault(gram, set()).add(key)
+        return entry
+
+    def _add(self, category: str, brand_names: Iterable[str], substance_names: Iterable[str]) -> None:
+        brands = [entry for entry in map(self._entry, brand_names) if entry]
+        substances = [entry for entry in map(self._entry, substance_names) if entry]
+        for entry in brands:
+            entry.kinds.add("brand")
+        for entry in substances:
+            entry.kinds.add("substance")
+        for entry in brands + substances:
+            entry.categories.add(category)
+            for other in brands + substances:
+                if other is not entry:
+                    entry.synonyms.setdefault(other.key, other.name)
+
+    def add(self, category: str, brand_names: Iterable[str], substance_names: Iterable[str]) -> None:
+        """
+        Index the names of one label saved under `category`; all of them become synonyms of each other.
+
+        Args:
+            category (str): Category the label is saved under
+            brand_names (Iterable[str]): Its brand names
+            substance_names (Iterable[str]): Its substance and generic names
+        """
+        self.add_labels(category, [(brand_names, substance_names)])
+
+    def add_labels(self, category: str, labels: Iterable[Tuple[Iterable[str], Iterable[str]]]) -> None:
+        """Index the (brand names, substance names) of several labels saved under `category` (see add)."""
+        with self._lock:
+            if self._built:
+                for brand_names, substance_names in labels:
+                    self._add(category, list(brand_names), list(substance_names))
+                # Our own write is already indexed; only changes by others need a rebuild
+                self._version = self.store.data_version()
+
+    def build(self) -> None:
+        """(Re)build the index from every record in the store."""
+        with self._lock:
+            self._names = {}
+            self._postings = {}
+            version = self.store.data_version()
+            for category, brand_name, substance_name in self.store.iter_names():
+                self._add(category, [brand_name], [substance_name])
+            self._version = version
+            self._checked = time.monotonic()
+            self._built = True
+
+    def _ensure_built(self) -> None:
+        if self._built:
+            now = time.monotonic()
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+            if self.store.data_version() == self._version:
+                return
+        self.build()
+
+    def _candidate(self, key: str, score: float) -> Dict[str, Any]:
+        entry = self._names[key]
+        synonyms = sorted(entry.synonyms.values())
+        return {
+            "name": entry.name,
+            "score": round(score, 3),
+            "kind": "/".join(sorted(entry.kinds)),
+            "categories": sorted(entry.categories),
+            "synonyms": synonyms[:MAX_SYNONYMS],
+            "synonyms_omitted": max(0, len(synonyms) - MAX_SYNONYMS),
+        }
+
+    def resolve(self, name: str, limit: int = 5, min_score: float = MIN_SCORE) -> List[Dict[str, Any]]:
+        """
+        Rank the known names closest to `name`.
+
+        Returns:
+            List[Dict[str, Any]]: Up to `limit` candidates, best first, each with its name, score
+            (1.0 for an exact or case-insensitive match), kind ('brand', 'substance' or both),
+            categories and synonyms
+        """
+        key = normalize_drug_name(name)
+        if not key:
+            return []
+        with self._lock:
+            self._ensure_built()
+            if key in self._names:
+                return [self._candidate(key, 1.0)]
+            grams = trigrams(key)
+            postings = sorted((self._postings[gram] for gram in grams if gram in self._postings), key=len)
+            shared: Counter = Counter()
+            scanned = 0
+            for names in postings:
+                if scanned and scanned + len(names) > MAX_POSTINGS:
+                    break
+                shared.update(names)
+                scanned += len(names)
+            overlap = {
+                other: count / (len(grams) + len(self._names[other].grams) - count)
+                for other, count in shared.items()
+            }
+            shortlist = heapq.nlargest(SHORTLIST_SIZE, overlap, key=overlap.get)
+            scored = [(similarity(key, other, min_score), other) for other in shortlist]
+            scored = sorted((item for item in scored if item[0] >= min_score), key=lambda item: (-item[0], item[1]))
+            return [self._candidate(other, score) for score, other in scored[:limit]]
+
+    def best(self, name: str, kind: Optional[str] = None, min_score: float = ACCEPT_SCORE) -> Optional[Dict[str, Any]]:
+        """
+        The candidate `name` most likely means, if there is a clear one.
+
+        Args:
+            name (str): Name to resolve
+            kind (Optional[str]): Only consider 'brand' or 'substance' names
+            min_score (float): Lowest acceptable score
+
+        Returns:
+            Optional[Dict[str, Any]]: The top candidate if it scores at least `min_score` and
+            better than the runner-up (a tie, e.g. 'brand' between 'Brand 1' and 'Brand 2', is
+            not a clear answer), else None
+        """
+        candidates = [
+            candidate for candidate in self.resolve(name, limit=SHORTLIST_SIZE, min_score=min_score)
+            if kind is None or kind in candidate["kind"]
+        ]
+        if not candidates or (len(candidates) > 1 and candidates[1]["score"] == candidates[0]["score"]):
+            return None
+        return candidates[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"names": len(self._names), "trigrams": len(self._postings)}
+
+    def warm(self) -> None:
+        """Build the index in the background; resolve() waits on the lock until it is ready."""
+        threading.Thread(target=self._ensure_built_locked, name="name-index-warm", daemon=True).start()
+
+    def _ensure_built_locked(self) -> None:
+        with self._lock:
+            self._ensure_built()
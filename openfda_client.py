@@ -0,0 +1,404 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from metrics import Metrics, get_metrics
+
+OPENFDA_BASE_URL = os.environ.get("OPENFDA_BASE_URL", "https://api.fda.gov")
+
+# Published openFDA quotas: 240 requests/minute, and 1,000 (keyless) or 120,000 (with key) per day
+OPENFDA_RATE_PER_MINUTE = 240
+OPENFDA_DAILY_QUOTA = 1000
+OPENFDA_DAILY_QUOTA_WITH_KEY = 120000
+
+# openFDA rejects skip values above this; deeper pages need search_after (the Link header)
+OPENFDA_MAX_SKIP = 25000
+OPENFDA_MAX_LIMIT = 1000
+
+
+class OpenFDAError(Exception):
+    """An openFDA request that still failed after rate limiting and retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _next_link(value: Optional[str]) -> Optional[str]:
+    """Extract the rel="next" URL from a Link header, without any api_key parameter."""
+    for part in (value or "").split(","):
+        url, _, params = part.partition(";")
+        if 'rel="next"' in params.replace(" ", ""):
+            url = url.strip().strip("<>")
+            if "api_key=" in url:
+                # The URL becomes a checkpointed cursor; a key echoed back in it must not be stored
+                url = str(httpx.URL(url).copy_remove_param("api_key"))
+            return url
+    return None
+
+
+class LabelPage(NamedTuple):
+    """One page of label results and the cursor to resume after it (None when finished)."""
+    results: List[dict]
+    next_cursor: Optional[str]
+    total: int
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as delta-seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every request of one client, plus a daily request counter.
+
+    Args:
+        rate_per_minute (float): Sustained request rate; 0 disables the bucket
+        burst (int): Bucket capacity, i.e. how many requests may go out back to back
+        daily_quota (int): Requests allowed per UTC day; 0 disables the counter
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, daily_quota: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.daily_quota = daily_quota
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._day = None
+        self._used_today = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def block_for(self, seconds: float) -> None:
+        """Hold back every caller, e.g. after a 429 with Retry-After."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def _take_daily(self) -> None:
+        if not self.daily_quota:
+            return
+        today = datetime.now(timezone.utc).date()
+        if today != self._day:
+            self._day, self._used_today = today, 0
+        if self._used_today >= self.daily_quota:
+            raise OpenFDAError(
+                f"openFDA daily quota of {self.daily_quota} requests is used up; set OPENFDA_API_KEY to raise it",
+                429,
+            )
+        self._used_today += 1
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Callers queue on the lock so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                if not self.rate:
+                    break
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+            self._take_daily()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokens": round(self._tokens, 2),
+            "used_today": self._used_today,
+            "daily_quota": self.daily_quota,
+        }
+
+
+class OpenFDAClient:
+    """
+    Shared, connection-pooled async HTTP client for the openFDA API.
+
+    One client is reused across tool calls so TCP/TLS connections are kept alive between requests,
+    and a semaphore caps how many requests are in flight at once so parallel tool calls share the
+    pool fairly instead of opening a connection each.
+
+    All traffic goes through a shared RateLimiter. 429 responses are retried after their Retry-After
+    delay, 5xx responses and transport errors with jittered exponential backoff, and identical
+    requests already in flight are collapsed into one (single-flight).
+
+    Args:
+        base_url (str): openFDA root URL (override with OPENFDA_BASE_URL to point at a local stub)
+        timeout (float): Read/write/pool timeout in seconds
+        connect_timeout (float): Connect timeout in seconds
+        max_connections (int): Maximum number of pooled connections
+        max_keepalive (int): Maximum number of idle keep-alive connections
+        concurrency (int): Maximum number of requests in flight at once
+        api_key (Optional[str]): openFDA API key, sent as Basic auth with every request to lift the daily quota
+        rate_per_minute (float): Sustained request rate (0 disables rate limiting)
+        burst (int): Requests that may be sent back to back before the rate applies
+        daily_quota (Optional[int]): Requests per day (0 disables; None picks the openFDA default)
+        max_retries (int): Retries for 429, 5xx and transport errors
+        backoff_base (float): First backoff delay in seconds, doubled on every retry
+        backoff_max (float): Upper bound of a single backoff delay in seconds
+        metrics (Optional[Metrics]): Registry for request timings and byte counts (default: the process-wide one)
+    """
+
+    def __init__(
+        self,
+        base_url: str = OPENFDA_BASE_URL,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        concurrency: int = 8,
+        api_key: Optional[str] = None,
+        rate_per_minute: float = OPENFDA_RATE_PER_MINUTE,
+        burst: int = 40,
+        daily_quota: Optional[int] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self.concurrency = concurrency
+        self.api_key = api_key
+        if daily_quota is None:
+            daily_quota = OPENFDA_DAILY_QUOTA_WITH_KEY if api_key else OPENFDA_DAILY_QUOTA
+        self.limiter = RateLimiter(rate_per_minute, burst, daily_quota)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics or get_metrics()
+        self.retries = 0
+        self.collapsed = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls) -> "OpenFDAClient":
+        """Build a client configured from OPENFDA_* environment variables."""
+        return cls(
+            base_url=os.environ.get("OPENFDA_BASE_URL", OPENFDA_BASE_URL),
+            timeout=_env_float("OPENFDA_TIMEOUT", 30.0),
+            connect_timeout=_env_float("OPENFDA_CONNECT_TIMEOUT", 10.0),
+            max_connections=_env_int("OPENFDA_MAX_CONNECTIONS", 20),
+            max_keepalive=_env_int("OPENFDA_MAX_KEEPALIVE", 10),
+            concurrency=_env_int("OPENFDA_CONCURRENCY", 8),
+            api_key=os.environ.get("OPENFDA_API_KEY") or None,
+            rate_per_minute=_env_float("OPENFDA_RATE_PER_MINUTE", OPENFDA_RATE_PER_MINUTE),
+            burst=_env_int("OPENFDA_BURST", 40),
+            daily_quota=_env_int("OPENFDA_DAILY_QUOTA", -1) if os.environ.get("OPENFDA_DAILY_QUOTA") else None,
+            max_retries=_env_int("OPENFDA_MAX_RETRIES", 4),
+        )
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool and semaphore bind to the loop that actually serves requests
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={"Accept": "application/json"},
+                # openFDA takes the key as the Basic auth user name; unlike an api_key query
+                # parameter it never shows up in logged URLs or saved cursors
+                auth=(self.api_key, "") if self.api_key else None,
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps concurrent retries from hitting openFDA in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, response: httpx.Response, seconds: float) -> None:
+        # Wire sizes of the HTTP/1.1 request and response, headers included
+        request = response.request
+        sent = len(request.method) + len(request.url.raw_path) + 12 + len(request.content)
+        sent += sum(len(name) + len(value) + 4 for name, value in request.headers.raw) + 2
+        received = response.num_bytes_downloaded + 2
+        received += sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+        self.metrics.observe("openfda_request_seconds", seconds, status=response.status_code)
+        self.metrics.inc("openfda_bytes_written_total", sent)
+        self.metrics.inc("openfda_bytes_read_total", received)
+
+    async def _send(self, path: str) -> httpx.Response:
+        client = self._ensure_client()
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(path)
+            except httpx.TransportError as e:
+                self.metrics.observe("openfda_request_seconds", time.perf_counter() - start, status="error")
+                if attempt >= self.max_retries:
+                    raise OpenFDAError(f"openFDA request failed: {e!r}") from e
+                delay = self._backoff(attempt)
+            else:
+                self._record(response, time.perf_counter() - start)
+                if response.status_code == 429:
+                    if attempt >= self.max_retries:
+                        raise OpenFDAError("openFDA rate limit exceeded (HTTP 429)", 429)
+                    delay = _retry_after_seconds(response.headers.get("Retry-After"))
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    # Everyone sharing the quota waits, not only this caller
+                    self.limiter.block_for(delay)
+                elif response.status_code >= 500:
+                    if attempt >= self.max_retries:
+                        raise OpenFDAError(f"openFDA server error (HTTP {response.status_code})", response.status_code)
+                    delay = self._backoff(attempt)
+                else:
+                    return response
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, path: str) -> Tuple[int, Dict[str, Any]]:
+        response = await self._send(path)
+        if response.status_code != 200:
+            return response.status_code, {}
+        return response.status_code, response.json()
+
+    async def get_json(self, path: str) -> Tuple[int, Dict[str, Any]]:
+        """
+        GET a path (including its query string) relative to the base URL.
+
+        Concurrent calls for the same path share a single request.
+
+        Args:
+            path (str): Request path, e.g. '/drug/label.json?search=...&limit=5'
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: HTTP status code and decoded JSON body ({} for non-200 responses,
+            e.g. 404 when nothing matched)
+
+        Raises:
+            OpenFDAError: If the request still fails with 429, 5xx or a transport error after retries,
+            or the daily quota is used up
+        """
+        inflight = self._inflight.get(path)
+        if inflight is not None:
+            self.collapsed += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.ensure_future(self._fetch(path))
+        self._inflight[path] = future
+        future.add_done_callback(lambda _: self._inflight.pop(path, None))
+        return await asyncio.shield(future)
+
+    async def iter_label_pages(
+        self,
+        search: str,
+        page_size: int = 100,
+        cursor: Optional[str] = None,
+    ) -> AsyncIterator[LabelPage]:
+        """
+        Page through every /drug/label.json result of a search, one page at a time.
+
+        Pages are requested with skip/limit while skip stays within openFDA's 25,000 limit and then
+        by following the search_after URL openFDA returns in the Link header. Only the current page
+        is held in memory.
+
+        Args:
+            search (str): openFDA search expression, e.g. 'openfda.substance_name:ibuprofen'
+            page_size (int): Results per request (openFDA allows up to 1000)
+            cursor (Optional[str]): A next_cursor from an earlier page, to resume an interrupted run
+
+        Yields:
+            LabelPage: The page's results, the cursor of the following page and the total match count
+
+        Raises:
+            OpenFDAError: If a page still fails after retries
+        """
+        page_size = max(1, min(page_size, OPENFDA_MAX_LIMIT))
+        cursor = cursor or "skip:0"
+        while cursor:
+            if cursor.startswith("skip:"):
+                skip = int(cursor[len("skip:"):])
+                path = f"/drug/label.json?search={search}&limit={page_size}&skip={skip}"
+            else:
+                skip, path = None, cursor
+
+            response = await self._send(path)
+            if response.status_code == 404:
+                return
+            if response.status_code != 200:
+                raise OpenFDAError(f"openFDA returned HTTP {response.status_code}", response.status_code)
+
+            data = response.json()
+            results = data.get("results", [])
+            total = data.get("meta", {}).get("results", {}).get("total", 0)
+            link = _next_link(response.headers.get("Link"))
+
+            if not results:
+                cursor = None
+            elif skip is None:
+                cursor = link
+            elif skip + len(results) >= total:
+                cursor = None
+            elif skip + len(results) <= OPENFDA_MAX_SKIP:
+                cursor = f"skip:{skip + len(results)}"
+            elif link:
+                cursor = link
+            else:
+                raise OpenFDAError(
+                    f"openFDA gave no search_after link to page past skip={OPENFDA_MAX_SKIP} "
+                    f"({total} results in total)"
+                )
+            yield LabelPage(results, cursor, total)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"retries": self.retries, "collapsed": self.collapsed, **self.limiter.stats()}
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_client: Optional[OpenFDAClient] = None
+
+
+def get_client() -> OpenFDAClient:
+    """Return the process-wide openFDA client, creating it from the environment on first use."""
+    global _client
+    if _client is None:
+        _client = OpenFDAClient.from_env()
+    return _client
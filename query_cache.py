@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from drug_store import DrugStore
+
+QueryKey = Tuple[str, int]
+
+
+class QueryCache:
+    """
+    TTL + LRU cache of openFDA label query results (the brand names `search_drug_info` returns).
+
+    The in-memory tier is an OrderedDict bounded to `maxsize` entries. The optional on-disk tier
+    reuses the drug store, which records which query produced each saved category and when, so a
+    restarted server can still serve it without going back to openFDA. All methods are thread-safe
+    so lookups that fall through to the store can run in worker threads.
+
+    Args:
+        ttl (float): Seconds an entry stays fresh
+        maxsize (int): Maximum number of in-memory entries
+        store (Optional[DrugStore]): Drug store to use as the on-disk tier, or None to disable it
+    """
+
+    def __init__(self, ttl: float = 3600.0, maxsize: int = 256, store: Optional[DrugStore] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.store = store
+        self._entries: "OrderedDict[QueryKey, Tuple[float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, store: DrugStore) -> "QueryCache":
+        """Build a cache configured from DRUG_CACHE_* environment variables."""
+        disk_enabled = os.environ.get("DRUG_CACHE_DISK", "1").lower() not in ("0", "false", "no")
+        return cls(
+            ttl=float(os.environ.get("DRUG_CACHE_TTL", "3600")),
+            maxsize=int(os.environ.get("DRUG_CACHE_SIZE", "256")),
+            store=store if disk_enabled else None,
+        )
+
+    def _get_disk(self, key: QueryKey, category: str) -> Optional[Tuple[float, List[str]]]:
+        if not self.store:
+            return None
+        found = self.store.get_query(category, *key)
+        if found is None:
+            return None
+        fetched_at, brand_names = found
+        if time.time() - fetched_at > self.ttl:
+            return None
+        return fetched_at, brand_names
+
+    def get(self, key: QueryKey, category: str) -> Optional[List[str]]:
+        """
+        Look up a query, checking memory first and then the on-disk tier.
+
+        Returns:
+            Optional[List[str]]: Cached brand names, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        found = self._get_disk(key, category)
+        with self._lock:
+            if found is not None:
+                fetched_at, value = found
+                self.disk_hits += 1
+                # Keep the age the entry already has on disk so it expires on the original schedule
+                self._remember(key, value, age=max(0.0, time.time() - fetched_at))
+                return value
+            self.misses += 1
+            return None
+
+    def _remember(self, key: QueryKey, value: List[str], age: float = 0.0) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl - age, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: QueryKey, category: str, value: List[str]) -> None:
+        """Store a query result after its category has been saved."""
+        with self._lock:
+            self._remember(key, value)
+        if self.store:
+            self.store.put_query(category, *key, value)
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for sizing the cache."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+class VersionedCache:
+    """
+    LRU cache of values derived from the drug store, each tagged with the store version it was
+    computed from (see DrugStore.version).
+
+    An entry is only returned while the store still reports the same version, so writes by other
+    processes invalidate it too. The cache is an OrderedDict bounded to `maxsize` entries, and all
+    methods are thread-safe.
+
+    Args:
+        maxsize (int): Maximum number of entries
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """Return the value cached for `key` if it was computed from `version`, else None."""
+        if version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any) -> None:
+        """Cache a value computed from `version` (nothing is cached without a version)."""
+        if version is None or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Drop the entry for `key`, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import pytest
+
+# drugs_research opens its store when imported; keep it (and any stray writes) out of the tree
+os.environ.setdefault("DRUG_DIR", tempfile.mkdtemp(prefix="drugs-tests-"))
+
+
+class FakeOpenFDA:
+    """Stands in for the openFDA client: answers get_json from a function and records every path."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.paths = []
+
+    async def get_json(self, path):
+        self.paths.append(path)
+        return self.respond(path)
+
+
+@pytest.fixture
+def research(tmp_path, monkeypatch):
+    """drugs_research with a fresh SQLite store, query cache and name index under tmp_path."""
+    import drugs_research
+    from drug_store import SQLiteStore
+    from name_index import NameIndex
+    from query_cache import QueryCache
+
+    store = SQLiteStore(str(tmp_path / "drugs.db"))
+    monkeypatch.setattr(drugs_research, "store", store)
+    monkeypatch.setattr(drugs_research, "query_cache", QueryCache(store=store))
+    monkeypatch.setattr(drugs_research, "name_index", NameIndex(store))
+    yield drugs_research
+    store.close()
+
+
+@pytest.fixture
+def openfda(research, monkeypatch):
+    """Install a FakeOpenFDA; set its .respond to script the answers (default: HTTP 404)."""
+    fake = FakeOpenFDA(lambda path: (404, {}))
+    monkeypatch.setattr(research, "get_client", lambda: fake)
+    return fake
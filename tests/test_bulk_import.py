@@ -0,0 +1,74 @@
+import io
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from bulk_import import import_partition, iter_results, iter_zip_labels, label_category
+
+LABELS = [
+    {"openfda": {"brand_name": ["Advil"], "substance_name": ["IBUPROFEN"]}, "warnings": ["Stop use if [rash] occurs, then ask a doctor."]},
+    {"openfda": {"brand_name": ["Motrin IB"], "substance_name": ["IBUPROFEN"]}, "purpose": ['Pain reliever "NSAID"']},
+    {"openfda": {"brand_name": ["Tylenol"], "generic_name": ["ACETAMINOPHEN"]}, "warnings": ["Liver warning: été }, ]"]},
+    {"openfda": {}, "purpose": ["No openfda section"]},
+    {"openfda": {"substance_name": ["NAPROXEN"]}, "purpose": ["No brand name"]},
+]
+# "meta" also holds a "results" key, with an object value, before the real array
+DOCUMENT = json.dumps({"meta": {"results": {"skip": 0, "limit": 5, "total": 5}}, "results": LABELS}, indent=1)
+
+
+def write_zip(path, document=DOCUMENT):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("drug-label-0001-of-0001.json", document)
+        archive.writestr("README.txt", "not a partition")
+    return str(path)
+
+
+def test_iter_results_every_chunk_size():
+    # Every chunk boundary falls inside a key, a string, an escape or between two labels once
+    for chunk_size in range(1, len(DOCUMENT) + 2):
+        assert list(iter_results(io.StringIO(DOCUMENT), chunk_size)) == LABELS, chunk_size
+
+
+def test_iter_results_empty_array():
+    assert list(iter_results(io.StringIO('{"meta": {}, "results": [ ]}'), 3)) == []
+
+
+@pytest.mark.parametrize("document", ['{"meta": {"results": {}}}', '{"results": [{"a": 1}, {"b": '])
+def test_iter_results_malformed(document):
+    with pytest.raises(ValueError):
+        list(iter_results(io.StringIO(document), 4))
+
+
+def test_iter_results_malformed_label_is_not_buffered_to_the_end():
+    document = '{"results": [{"a": 1}, {"b": }, ' + ", ".join(['{"c": 2}'] * 1000) + "]}"
+    stream = io.StringIO(document)
+    with pytest.raises(ValueError, match="offset 23"):
+        list(iter_results(stream, chunk_size=8, max_label_chars=64))
+    assert stream.tell() < 100
+
+
+def test_iter_zip_labels_skips_other_members(tmp_path):
+    assert list(iter_zip_labels(write_zip(tmp_path / "dump.zip"))) == LABELS
+
+
+def test_label_category():
+    assert [label_category(label) for label in LABELS] == ["ibuprofen", "ibuprofen", "acetaminophen", None, "naproxen"]
+
+
+def test_import_partition(tmp_path):
+    db_path = str(tmp_path / "drugs.db")
+    zip_path, rows, skipped, _, _ = import_partition(write_zip(tmp_path / "dump.zip"), db_path, batch_size=3)
+    # Labels without a brand name are skipped rather than saved as "Unknown"
+    assert (zip_path, rows, skipped) == (str(tmp_path / "dump.zip"), 3, 2)
+
+    conn = sqlite3.connect(db_path)
+    saved = conn.execute("SELECT category, brand_name FROM drugs ORDER BY category, brand_name").fetchall()
+    assert saved == [
+        ("acetaminophen", "Tylenol"),
+        ("ibuprofen", "Advil"),
+        ("ibuprofen", "Motrin IB"),
+    ]
+    categories = conn.execute("SELECT name FROM categories ORDER BY name").fetchall()
+    assert categories == [("acetaminophen",), ("ibuprofen",)]
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from benchmarks.openfda_stub import start_stub
+from openfda_client import OPENFDA_MAX_SKIP, OpenFDAClient
+
+TOTAL = 27500
+
+
+@pytest.fixture
+def stub():
+    server = start_stub(total=TOTAL)
+    yield server
+    server.shutdown()
+
+
+def stub_client(server):
+    return OpenFDAClient(base_url=f"http://127.0.0.1:{server.server_port}", rate_per_minute=0, daily_quota=0)
+
+
+async def collect(client, cursor=None, pages=None):
+    """Page through the stub; returns the pages' (result count, next cursor)."""
+    seen = []
+    iterator = client.iter_label_pages("openfda.substance_name:ibuprofen", 1000, cursor)
+    try:
+        async for page in iterator:
+            seen.append((len(page.results), page.next_cursor))
+            if pages is not None and len(seen) == pages:
+                break
+    finally:
+        await iterator.aclose()
+        await client.aclose()
+    return seen
+
+
+def test_pages_past_max_skip_with_search_after(stub):
+    pages = asyncio.run(collect(stub_client(stub)))
+    assert sum(count for count, _ in pages) == TOTAL
+    cursors = [cursor for _, cursor in pages]
+    assert cursors[-1] is None
+    # skip/limit up to the openFDA maximum, then the Link header's search_after URLs
+    assert cursors[OPENFDA_MAX_SKIP // 1000 - 1] == f"skip:{OPENFDA_MAX_SKIP}"
+    assert "search_after=" in cursors[OPENFDA_MAX_SKIP // 1000]
+
+
+def test_resumes_from_a_search_after_cursor(stub):
+    first = asyncio.run(collect(stub_client(stub), pages=OPENFDA_MAX_SKIP // 1000 + 1))
+    cursor = first[-1][1]
+    assert "search_after=26000" in cursor
+    rest = asyncio.run(collect(stub_client(stub), cursor=cursor))
+    assert sum(count for count, _ in first + rest) == TOTAL
+
+
+def test_ingest_drug_checkpoints_and_resumes(research, stub, monkeypatch):
+    client = stub_client(stub)
+    monkeypatch.setattr(research, "get_client", lambda: client)
+
+    async def run():
+        try:
+            first = await research.ingest_drug("ibuprofen", page_size=1000, max_records=26000)
+            checkpoint = research.store.get_checkpoint("label:ibuprofen")
+            second = await research.ingest_drug("ibuprofen", page_size=1000)
+            # A finished ingest returns at once unless restarted
+            third = await research.ingest_drug("ibuprofen", page_size=1000)
+            restarted = await research.ingest_drug("ibuprofen", page_size=1000, restart=True, max_records=1000)
+        finally:
+            await client.aclose()
+        return first, checkpoint, second, third, restarted
+
+    first, checkpoint, second, third, restarted = asyncio.run(run())
+    assert (first["fetched"], first["done"]) == (26000, False)
+    assert checkpoint["fetched"] == 26000 and "search_after=26000" in checkpoint["cursor"]
+    assert (second["resumed"], second["fetched"], second["fetched_total"], second["done"]) == (True, 1500, TOTAL, True)
+    assert len(research.store.get_category("ibuprofen")) == TOTAL
+    assert third["fetched"] == 0
+    assert restarted["fetched"] == 1000
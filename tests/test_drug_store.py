@@ -0,0 +1,226 @@
+import os
+import shutil
+import stat
+import threading
+
+import pytest
+
+import drug_store
+from drug_store import INDEX_SNAPSHOT, BrandIndex, JsonDirStore, SQLiteStore, write_bytes_atomic
+
+ADVIL = {
+    "brand_name": "Advil",
+    "substance_name": "IBUPROFEN",
+    "warnings": "Stomach bleeding warning: the chance is higher if you take other NSAIDs.",
+    "purpose": "Pain reliever",
+}
+TYLENOL = {
+    "brand_name": "Tylenol",
+    "substance_name": "ACETAMINOPHEN",
+    "warnings": "Liver warning: severe liver damage may occur.",
+    "adverse_reactions": "Rarely, stomach upset.",
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "drugs.db"))
+    store.save_category("ibuprofen", {"Advil": ADVIL})
+    store.save_category("acetaminophen", {"Tylenol": TYLENOL})
+    yield store
+    store.close()
+
+
+def test_categories_and_records(store):
+    assert store.list_categories() == ["acetaminophen", "ibuprofen"]
+    assert store.get_category("ibuprofen")["Advil"]["purpose"] == "Pain reliever"
+    assert store.get_category("naproxen") is None
+    # Exact brand first, then the normalized name
+    assert store.get_record("Advil")[0] == "ibuprofen"
+    assert store.get_record("ADVIL")[0] == "ibuprofen"
+    assert store.get_record("Motrin") is None
+
+
+def test_save_category_merges(store):
+    version = store.version("ibuprofen")
+    store.save_category("ibuprofen", {"Motrin IB": {"brand_name": "Motrin IB", "substance_name": "IBUPROFEN"}})
+    assert list(store.get_category("ibuprofen")) == ["Advil", "Motrin IB"]
+    assert store.version("ibuprofen") != version
+    # Missing fields of a record are stored as NULL, not as another record's values
+    assert store.get_category("ibuprofen")["Motrin IB"]["warnings"] is None
+
+
+def test_queries(store):
+    assert store.get_query("ibuprofen", "ibuprofen", 5) is None
+    store.put_query("ibuprofen", "ibuprofen", 5, ["Advil"])
+    fetched_at, brand_names = store.get_query("ibuprofen", "ibuprofen", 5)
+    assert brand_names == ["Advil"] and fetched_at > 0
+
+
+def test_search_text_requires_every_word(store):
+    assert [hit["brand_name"] for hit in store.search_text("liver damage")] == ["Tylenol"]
+    assert store.search_text("liver bleeding") == []
+
+
+def test_search_text_fields_and_snippets(store):
+    hits = store.search_text("stomach")
+    assert {hit["brand_name"] for hit in hits} == {"Advil", "Tylenol"}
+    assert [hit["brand_name"] for hit in store.search_text("stomach", fields=["adverse_reactions"])] == ["Tylenol"]
+    advil = next(hit for hit in hits if hit["brand_name"] == "Advil")
+    assert list(advil["snippets"]) == ["warnings"]
+    assert "**Stomach**" in advil["snippets"]["warnings"]
+
+
+def test_search_text_treats_fts_syntax_as_words(store):
+    # Operators, quotes and column filters in the query are not passed to FTS5 as syntax
+    assert [hit["brand_name"] for hit in store.search_text('liver OR "NSAIDs" NOT')] == []
+    assert [hit["brand_name"] for hit in store.search_text("warnings: NSAIDs*")] == ["Advil"]
+    assert store.search_text("-- ()") == []
+
+
+def test_search_text_unknown_field(store):
+    with pytest.raises(ValueError):
+        store.search_text("liver", fields=["manufacturer"])
+
+
+def test_add_categories(store):
+    store.add_categories({
+        "ibuprofen": {"Motrin IB": {"brand_name": "Motrin IB", "substance_name": "IBUPROFEN"}},
+        "naproxen": {"Aleve": {"brand_name": "Aleve", "substance_name": "NAPROXEN SODIUM"}},
+    })
+    assert store.list_categories() == ["acetaminophen", "ibuprofen", "naproxen"]
+    assert list(store.get_category("ibuprofen")) == ["Advil", "Motrin IB"]
+    assert store.get_record("aleve")[0] == "naproxen"
+
+
+def test_search_text_clamps_limit(store):
+    # A negative LIMIT would mean no limit at all to SQLite
+    assert len(store.search_text("warning", limit=-1)) == 1
+    assert len(store.search_text("warning", limit=10**9)) == 2
+
+
+def test_json_store_search_text(tmp_path):
+    store = JsonDirStore(str(tmp_path))
+    store.save_category("ibuprofen", {"Advil": ADVIL})
+    store.save_category("acetaminophen", {"Tylenol": TYLENOL})
+    assert [hit["brand_name"] for hit in store.search_text("liver damage")] == ["Tylenol"]
+    assert store.search_text("liver bleeding") == []
+    hits = store.search_text("STOMACH", fields=["warnings"], limit=0)
+    assert [hit["brand_name"] for hit in hits] == ["Advil"]
+    assert list(hits[0]["snippets"]) == ["warnings"]
+    assert hits[0]["snippets"]["warnings"].startswith("**Stomach** bleeding warning")
+    with pytest.raises(ValueError):
+        store.search_text("liver", fields=["manufacturer"])
+
+
+def test_json_store_concurrent_writers_merge(tmp_path):
+    store = JsonDirStore(str(tmp_path))
+    errors = []
+
+    def write(worker):
+        records = {f"Brand {worker}-{i}": {"brand_name": f"Brand {worker}-{i}"} for i in range(20)}
+        for name, record in records.items():
+            store.save_category("ibuprofen", {name: record})
+
+    def read():
+        # Readers see the old or the new file, never a partial one
+        for _ in range(200):
+            try:
+                store.get_category("ibuprofen")
+            except ValueError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    threads.append(threading.Thread(target=read))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(store.get_category("ibuprofen")) == 160
+    assert store.get_record("brand 3-7")[0] == "ibuprofen"
+    assert not [name for name in os.listdir(tmp_path / "ibuprofen") if name.endswith(".tmp")]
+
+
+@pytest.mark.skipif(not hasattr(os, "fchmod"), reason="no POSIX file modes")
+def test_write_bytes_atomic_file_mode(tmp_path):
+    path = str(tmp_path / "data.json")
+    write_bytes_atomic(path, [b"{}"])
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o666 & ~drug_store._UMASK
+    # A replaced file keeps its mode
+    os.chmod(path, 0o640)
+    write_bytes_atomic(path, [b"[]"])
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+@pytest.fixture
+def json_root(tmp_path):
+    store = JsonDirStore(str(tmp_path))
+    store.save_category("ibuprofen", {"Advil": ADVIL})
+    store.save_category("acetaminophen", {"Tylenol": TYLENOL})
+    return str(tmp_path)
+
+
+def snapshot_index(root, monkeypatch):
+    """A fresh BrandIndex over root that records which category files it parses."""
+    index = BrandIndex(root, os.path.join(root, INDEX_SNAPSHOT))
+    parsed = []
+    load = index._load
+    monkeypatch.setattr(index, "_load", lambda category, mtime_ns: parsed.append(category) or load(category, mtime_ns))
+    return index, parsed
+
+
+def test_index_snapshot_round_trip(json_root, monkeypatch):
+    index, parsed = snapshot_index(json_root, monkeypatch)
+    assert index.lookup("advil")[0] == "ibuprofen"
+    assert sorted(parsed) == ["acetaminophen", "ibuprofen"]
+    assert index.write_snapshot()
+    # Nothing changed since
+    assert not index.write_snapshot()
+
+    # A new process takes the index over from the snapshot without parsing any file
+    index, parsed = snapshot_index(json_root, monkeypatch)
+    assert index.lookup("TYLENOL") == ("acetaminophen", TYLENOL)
+    assert index.lookup("Advil") == ("ibuprofen", ADVIL)
+    assert parsed == []
+    assert not index.write_snapshot()
+
+
+def test_index_snapshot_invalidation(json_root, monkeypatch):
+    index, _ = snapshot_index(json_root, monkeypatch)
+    index.lookup("advil")
+    index.write_snapshot()
+
+    store = JsonDirStore(json_root)
+    store.save_category("ibuprofen", {"Motrin IB": {"brand_name": "Motrin IB", "substance_name": "IBUPROFEN"}})
+    # Make sure the rewrite is visible even on filesystems with coarse timestamps
+    path = os.path.join(json_root, "ibuprofen", "drug_info.json")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    shutil.rmtree(os.path.join(json_root, "acetaminophen"))
+
+    # Only the changed category is parsed again; the removed one is dropped
+    index, parsed = snapshot_index(json_root, monkeypatch)
+    assert index.lookup("motrin ib")[0] == "ibuprofen"
+    assert parsed == ["ibuprofen"]
+    assert index.lookup("Tylenol") is None
+    assert index.write_snapshot()
+
+
+def test_index_snapshot_ignores_unreadable_snapshot(json_root, monkeypatch, capsys):
+    with open(os.path.join(json_root, INDEX_SNAPSHOT), "wb") as f:
+        f.write(b"\x05\x00\x00\x00\x00\x00\x00\x00junk!")
+    index, parsed = snapshot_index(json_root, monkeypatch)
+    assert index.lookup("advil")[0] == "ibuprofen"
+    assert sorted(parsed) == ["acetaminophen", "ibuprofen"]
+    assert "Ignoring index snapshot" in capsys.readouterr().err
+
+
+def test_data_version_changes_with_every_write(store, tmp_path):
+    json_store = JsonDirStore(str(tmp_path / "json"))
+    json_store.save_category("ibuprofen", {"Advil": ADVIL})
+    for backend in (store, json_store):
+        before = backend.data_version(), backend.version()
+        # Adding a record to an existing category leaves the category list as it was
+        backend.save_category("ibuprofen", {"Motrin IB": {"brand_name": "Motrin IB", "substance_name": "IBUPROFEN"}})
+        assert backend.version() == before[1]
+        assert backend.data_version() != before[0]
@@ -0,0 +1,61 @@
+from drug_summary import aggregate_category, comparison_view, safety_view, split_statements
+
+SHARED = "Do not use if you have ever had an allergic reaction to any other pain reliever."
+RECORDS = {
+    "Advil": {
+        "manufacturer": "Pfizer",
+        "route": "ORAL",
+        "substance_name": "IBUPROFEN",
+        "warnings": f"{SHARED} Stomach bleeding warning: this product contains an NSAID.",
+        "adverse_reactions": "Not specified",
+        "boxed_warning": "None",
+    },
+    "Motrin IB": {
+        "manufacturer": "Kenvue",
+        "route": "ORAL",
+        "substance_name": "IBUPROFEN",
+        "warnings": f"{SHARED.upper()}\n• Heart attack and stroke warning applies to this product.",
+        "adverse_reactions": "Nausea and heartburn were reported in some patients.",
+        "boxed_warning": "Cardiovascular thrombotic events may occur with NSAIDs.",
+    },
+    "Store Brand": {"manufacturer": "Unknown", "route": "ORAL", "substance_name": "IBUPROFEN"},
+}
+
+
+def test_split_statements():
+    assert split_statements("Not specified") == []
+    statements = split_statements(f"{SHARED} Ask a doctor. {SHARED.lower()}")
+    # Short headings are skipped and repeats (ignoring case and punctuation) kept once
+    assert [statement for _, statement in statements] == [SHARED]
+
+
+def test_aggregate_category():
+    aggregate = aggregate_category("ibuprofen", RECORDS)
+    assert aggregate["product_count"] == 3
+    assert aggregate["manufacturers"] == {"Kenvue": ["Motrin IB"], "Pfizer": ["Advil"], "Unknown": ["Store Brand"]}
+    assert aggregate["routes"] == {"ORAL": ["Advil", "Motrin IB", "Store Brand"]}
+    warnings = aggregate["warnings"]
+    assert warnings["labelled_products"] == 2
+    # The statement both labels carry ranks first, whatever its case
+    assert warnings["statements"][0] == {"statement": SHARED, "products": 2}
+    assert warnings["unique"] == {
+        "Advil": ["Stomach bleeding warning: this product contains an NSAID."],
+        "Motrin IB": ["Heart attack and stroke warning applies to this product."],
+    }
+    assert aggregate["adverse_reactions"]["labelled_products"] == 1
+    assert list(aggregate["boxed_warnings"]) == ["Motrin IB"]
+    assert [brand for brand, info in aggregate["products"].items() if info["has_boxed_warning"]] == ["Motrin IB"]
+
+
+def test_views_cut_lists_to_max_items():
+    aggregate = aggregate_category("ibuprofen", RECORDS)
+    comparison = comparison_view(aggregate, max_items=1)
+    assert [row["brand_name"] for row in comparison["products"]] == ["Advil"]
+    assert comparison["products_omitted"] == 2
+    assert comparison["shared_warnings"] == [{"statement": SHARED, "products": 2}]
+    assert comparison["manufacturers"] == {"Kenvue": 1, "Pfizer": 1, "Unknown": 1}
+
+    safety = safety_view(aggregate, max_items=1)
+    assert safety["boxed_warning_count"] == 1
+    assert len(safety["common_warnings"]) == 1
+    assert safety["products_with_adverse_reactions"] == 1
@@ -0,0 +1,113 @@
+import asyncio
+
+from benchmarks.openfda_stub import make_label
+from openfda_client import OpenFDAError
+
+
+def labels(*names, per_name=2):
+    return {"results": [make_label(name, i) for name in names for i in range(per_name)]}
+
+
+def test_matches(research):
+    label = make_label("naproxen sodium", 0)
+    assert research._matches("naproxen", label)
+    assert research._matches("NAPROXEN  Sodium", label)
+    assert research._matches("Naproxen Sodium Brand", label)
+    assert not research._matches("naproxen potassium", label)
+
+
+def test_search_group_splits_one_query(research, openfda):
+    openfda.respond = lambda path: (200, labels("ibuprofen", "naproxen"))
+    outcome = asyncio.run(research._search_group(["ibuprofen", "naproxen"], 2))
+    assert len(openfda.paths) == 1
+    assert outcome["ibuprofen"]["brand_names"] == ["Ibuprofen Brand 0", "Ibuprofen Brand 1"]
+    assert outcome["naproxen"]["brand_names"] == ["Naproxen Brand 0", "Naproxen Brand 1"]
+    assert research.store.list_categories() == ["ibuprofen", "naproxen"]
+
+
+def test_search_group_falls_back_for_missing_share(research, openfda):
+    # The OR-ed query returned nothing for naproxen, so it is asked for on its own
+    openfda.respond = lambda path: (200, labels("naproxen" if path.count("openfda.brand_name") == 1 else "ibuprofen"))
+    outcome = asyncio.run(research._search_group(["ibuprofen", "naproxen"], 2))
+    assert len(openfda.paths) == 2 and "naproxen" in openfda.paths[1] and "ibuprofen" not in openfda.paths[1]
+    assert outcome["naproxen"]["brand_names"] == ["Naproxen Brand 0", "Naproxen Brand 1"]
+
+
+def test_search_group_falls_back_after_bad_request(research, openfda):
+    openfda.respond = lambda path: (400, {}) if path.count("openfda.brand_name") > 1 else (200, labels("aspirin"))
+    outcome = asyncio.run(research._search_group(["aspirin", "advil"], 2))
+    assert len(openfda.paths) == 3
+    assert outcome["aspirin"]["brand_names"] == ["Aspirin Brand 0", "Aspirin Brand 1"]
+
+
+def test_search_group_does_not_retry_rate_limits_per_name(research, openfda):
+    def respond(path):
+        raise OpenFDAError("openFDA rate limit exceeded (HTTP 429)", 429)
+
+    openfda.respond = respond
+    outcome = asyncio.run(research._search_group(["ibuprofen", "naproxen", "aspirin"], 2))
+    assert len(openfda.paths) == 1
+    assert outcome == {name: {"error": "openFDA rate limit exceeded (HTTP 429)"} for name in ("ibuprofen", "naproxen", "aspirin")}
+
+    openfda.respond = lambda path: (403, {})
+    outcome = asyncio.run(research._search_group(["ibuprofen", "naproxen"], 2))
+    assert len(openfda.paths) == 2
+    assert outcome["naproxen"] == {"error": "openFDA returned HTTP 403"}
+
+
+def test_cached_render_invalidation(research, monkeypatch):
+    monkeypatch.setattr(research, "_rendered", research.VersionedCache(maxsize=2))
+    research.store.save_category("ibuprofen", {"Advil": research.extract_record(make_label("ibuprofen", 0))})
+    renders = []
+
+    def render(uri="drugs://ibuprofen", category="ibuprofen"):
+        return research._cached_render(uri, category, lambda: renders.append(uri) or f"{uri} #{len(renders)}")
+
+    assert render() == render() == "drugs://ibuprofen #1"
+    # A write by another process changes the store version
+    research.store.save_category("ibuprofen", {"Motrin": research.extract_record(make_label("ibuprofen", 1))})
+    assert render() == "drugs://ibuprofen #2"
+    # A write through this server drops the entry at once
+    asyncio.run(research._category_saved("ibuprofen", created=False))
+    assert render() == "drugs://ibuprofen #3"
+
+    # Bounded: the least recently used resource is evicted
+    research.store.save_category("naproxen", {"Aleve": research.extract_record(make_label("naproxen", 0))})
+    render("drugs://categories", None)
+    render()
+    render("drugs://naproxen", "naproxen")
+    assert len(research._rendered) == 2
+    render("drugs://categories", None)
+    assert renders.count("drugs://categories") == 2 and renders.count("drugs://ibuprofen") == 3
+
+
+def test_concurrent_searches_merge_into_the_category(research, openfda):
+    # Each query returns different products of the same substance
+    def respond(path):
+        limit = int(path.rsplit("limit=", 1)[1])
+        return 200, {"results": [make_label("ibuprofen", limit * 10 + i) for i in range(limit)]}
+
+    async def search_all():
+        return await asyncio.gather(*(research.search_drug_info("ibuprofen", limit) for limit in range(1, 7)))
+
+    openfda.respond = respond
+    results = asyncio.run(search_all())
+    assert [len(brand_names) for brand_names in results] == [1, 2, 3, 4, 5, 6]
+    saved = research.store.get_category("ibuprofen")
+    assert len(saved) == 21 and set(saved) == {name for brand_names in results for name in brand_names}
+
+
+def test_category_aggregate_is_memoized_per_version(research, monkeypatch):
+    monkeypatch.setattr(research, "_aggregates", research.VersionedCache(maxsize=1))
+    research.store.save_category("ibuprofen", {"Advil": research.extract_record(make_label("ibuprofen", 0))})
+    research.store.save_category("naproxen", {"Aleve": research.extract_record(make_label("naproxen", 0))})
+
+    first = research._category_aggregate("ibuprofen")
+    assert research._category_aggregate("ibuprofen") is first
+    research.store.save_category("ibuprofen", {"Motrin": research.extract_record(make_label("ibuprofen", 1))})
+    second = research._category_aggregate("ibuprofen")
+    assert second is not first and second["product_count"] == 2
+    # Bounded to one category here: computing another evicts it
+    research._category_aggregate("naproxen")
+    assert research._category_aggregate("ibuprofen") is not second
+    assert research._category_aggregate("aspirin") is None
@@ -0,0 +1,186 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import anyio
+
+from benchmarks.bench_suite import MockLLM
+from mcp_chatbot import MCP_ChatBot, load_queries
+
+
+class FakeSession:
+    """Serves one tool until `alive` is cleared, then fails like a closed stdio connection."""
+
+    def __init__(self, name):
+        self.name = name
+        self.alive = True
+        self.calls = 0
+
+    async def call_tool(self, tool_name, arguments=None):
+        if not self.alive:
+            raise anyio.ClosedResourceError()
+        self.calls += 1
+        return SimpleNamespace(content=f"{self.name}: {tool_name}({arguments})", isError=False)
+
+
+def tool_use(name="lookup", tool_input=None):
+    return SimpleNamespace(id="toolu_1", name=name, input=tool_input or {})
+
+
+def connected_chatbot():
+    """A chatbot whose "drugs" server is started by registering a new FakeSession."""
+    chatbot = MCP_ChatBot(anthropic=object())
+    sessions = []
+
+    async def run_server(server_name, server):
+        session = FakeSession(f"session {len(sessions) + 1}")
+        sessions.append(session)
+        server["session"] = session
+        chatbot.sessions["lookup"] = session
+        chatbot.available_tools.append({"name": "lookup", "description": "", "input_schema": {}})
+        server["ready"].set_result(0.0)
+        await server["closed"].wait()
+
+    chatbot.run_server = run_server
+    return chatbot, sessions
+
+
+def test_dead_session_is_dropped_and_the_call_retried():
+    async def run():
+        chatbot, sessions = connected_chatbot()
+        await asyncio.wait_for(chatbot.connect_to_server("drugs", {}), 1)
+        first = await chatbot.call_tool(tool_use())
+
+        sessions[0].alive = False
+        second = await chatbot.call_tool(tool_use())
+        await chatbot.cleanup()
+        return chatbot, sessions, first, second
+
+    chatbot, sessions, first, second = asyncio.run(run())
+    assert first["content"].startswith("session 1")
+    # The request never reached the dead server, so it is sent once to the restarted one
+    assert second["content"].startswith("session 2") and "is_error" not in second
+    assert [session.calls for session in sessions] == [1, 1]
+    assert [tool["name"] for tool in chatbot.available_tools] == ["lookup"]
+
+
+def test_dead_server_tools_are_not_offered_until_it_restarts():
+    async def run():
+        chatbot, sessions = connected_chatbot()
+        await asyncio.wait_for(chatbot.connect_to_server("drugs", {}), 1)
+        old = chatbot.servers["drugs"]
+        chatbot.drop_session(sessions[0])
+        # Dropped at once; the restart registers them again once it is ready
+        offered = [tool["name"] for tool in chatbot.available_tools]
+        await chatbot.servers["drugs"]["ready"]
+        restarted = chatbot.servers["drugs"] is not old and old["closed"].is_set()
+        await chatbot.cleanup()
+        return chatbot, offered, restarted
+
+    chatbot, offered, restarted = asyncio.run(run())
+    assert offered == []
+    assert restarted
+    assert chatbot.request_tools()[0]["name"] == "lookup"
+
+
+def tool_result(text):
+    return {"type": "tool_result", "tool_use_id": "toolu_1", "content": text}
+
+
+def test_compact_messages_under_budget_is_untouched():
+    chatbot = MCP_ChatBot(anthropic=object())
+    chatbot.context_budget = 1000
+    messages = [{"role": "user", "content": "query"}, {"role": "user", "content": [tool_result("x" * 2000)]}]
+    chatbot.compact_messages(messages)
+    assert messages[1]["content"][0]["content"] == "x" * 2000
+
+
+def test_compact_messages_truncates_oldest_results_first():
+    chatbot = MCP_ChatBot(anthropic=object())
+    chatbot.context_budget = 2200
+    old, older, newest = tool_result("a" * 8000), tool_result("b" * 1000), tool_result("c" * 1000)
+    messages = [
+        {"role": "user", "content": "query"},
+        {"role": "user", "content": [old]},
+        {"role": "assistant", "content": "thinking"},
+        {"role": "user", "content": [older]},
+        {"role": "user", "content": [newest]},
+    ]
+    chatbot.compact_messages(messages)
+    # ~2500 tokens: cutting the oldest result gets under half the budget...
+    assert old["content"].startswith("a" * 500 + "\n[... 7500 characters")
+    # ...so the next one is kept, and the newest results, not yet seen by the model, are never cut
+    assert older["content"] == "b" * 1000
+    assert newest["content"] == "c" * 1000
+
+
+def test_compact_messages_joins_content_blocks():
+    chatbot = MCP_ChatBot(anthropic=object())
+    chatbot.context_budget = 100
+    blocks = [SimpleNamespace(text="d" * 400), SimpleNamespace(text="e" * 400)]
+    messages = [{"role": "user", "content": [tool_result(blocks)]}, {"role": "user", "content": "next"}]
+    chatbot.compact_messages(messages)
+    content = messages[0]["content"][0]["content"]
+    assert content.startswith("d" * 400 + "\n" + "e" * 99 + "\n[... 301 characters")
+
+
+def test_load_queries(tmp_path, capsys):
+    path = tmp_path / "queries.jsonl"
+    path.write_text(
+        '{"id": "a", "query": "Tell me about ibuprofen"}\n'
+        "\n"
+        '{"query": "Compare naproxen products"}\n'
+        '{"prompt": "no query field"}\n'
+        "plain text about aspirin\n",
+        encoding="utf-8",
+    )
+    assert load_queries(str(path)) == [
+        ("a", "Tell me about ibuprofen"),
+        ("3", "Compare naproxen products"),
+        ("5", "plain text about aspirin"),
+    ]
+    assert "Skipping line 4" in capsys.readouterr().out
+    assert load_queries(str(path), field="prompt", id_field="missing")[0] == ("4", "no query field")
+
+
+class SlowSession(FakeSession):
+    def __init__(self, name, slow_drug):
+        super().__init__(name)
+        self.slow_drug = slow_drug
+
+    async def call_tool(self, tool_name, arguments=None):
+        if (arguments or {}).get("drug_name") == self.slow_drug:
+            await asyncio.sleep(10)
+        return await super().call_tool(tool_name, arguments)
+
+
+def batch_chatbot():
+    chatbot = MCP_ChatBot(anthropic=MockLLM("Advil"))
+    session = SlowSession("research", slow_drug="naproxen")
+    chatbot.sessions = {"search_drug_info": session, "extract_drug_info": session}
+    return chatbot
+
+
+def test_run_batch_writes_one_result_per_query(tmp_path, capsys):
+    out_path = str(tmp_path / "results.jsonl")
+    queries = [("q1", "Tell me about ibuprofen"), ("q2", "Tell me about naproxen"), ("q3", "Tell me about aspirin")]
+    summary = asyncio.run(batch_chatbot().run_batch(queries, out_path, concurrency=2, timeout=0.5))
+
+    assert summary["queries"] == 3 and summary["statuses"] == {"ok": 2, "timeout": 1}
+    assert summary["tool_calls"] == 4
+    with open(out_path, encoding="utf-8") as f:
+        records = {record["id"]: record for record in map(json.loads, f)}
+    assert records["q1"]["answer"] == "Summary of the requested drug."
+    assert (records["q1"]["turns"], records["q1"]["tool_calls"]) == (2, 2)
+    assert records["q2"]["status"] == "timeout" and "0.5s" in records["q2"]["error"]
+    # Progress goes to stderr so stdout stays the JSON summary
+    assert "[3/3]" in capsys.readouterr().err
+
+
+def test_run_batch_resume_skips_finished_queries(tmp_path):
+    out_path = tmp_path / "results.jsonl"
+    out_path.write_text('{"id": "q1", "status": "ok"}\nnot json\n', encoding="utf-8")
+    queries = [("q1", "Tell me about ibuprofen"), ("q2", "Tell me about aspirin")]
+    summary = asyncio.run(batch_chatbot().run_batch(queries, str(out_path), resume=True))
+    assert (summary["queries"], summary["skipped"]) == (1, 1)
+    assert [json.loads(line)["id"] for line in out_path.read_text(encoding="utf-8").splitlines()[2:]] == ["q2"]
@@ -0,0 +1,94 @@
+import pytest
+
+import name_index
+from drug_store import SQLiteStore
+from name_index import ACCEPT_SCORE, VERSION_CHECK_INTERVAL, NameIndex, similarity
+
+
+@pytest.fixture
+def index(tmp_path):
+    store = SQLiteStore(str(tmp_path / "drugs.db"))
+    store.save_category("ibuprofen", {
+        "Advil": {"brand_name": "Advil", "substance_name": "IBUPROFEN"},
+        "Motrin IB": {"brand_name": "Motrin IB", "substance_name": "IBUPROFEN"},
+    })
+    store.save_category("prednisolone", {"Millipred": {"brand_name": "Millipred", "substance_name": "PREDNISOLONE"}})
+    store.save_category("insulin", {
+        "Novolin N": {"brand_name": "Novolin N", "substance_name": "INSULIN HUMAN"},
+        "Brand 1": {"brand_name": "Brand 1", "substance_name": "INSULIN HUMAN"},
+        "Brand 2": {"brand_name": "Brand 2", "substance_name": "INSULIN HUMAN"},
+    })
+    yield NameIndex(store)
+    store.close()
+
+
+def test_similarity():
+    assert similarity("advil", "advil") == 1.0
+    assert similarity("ibuprofn", "ibuprofen") == pytest.approx(1 - 1 / 9)
+    # Gives up once min_score is out of reach
+    assert similarity("ibuprofen", "zzz", min_score=0.5) == 0.0
+
+
+def test_best_exact_and_case_insensitive(index):
+    assert index.best("Advil")["score"] == 1.0
+    candidate = index.best("ADVIL")
+    assert (candidate["name"], candidate["score"]) == ("Advil", 1.0)
+    assert candidate["synonyms"] == ["IBUPROFEN"]
+
+
+def test_best_accepts_one_typo_in_a_long_name(index):
+    candidate = index.best("ibuprofn")
+    assert candidate["name"] == "IBUPROFEN"
+    assert ACCEPT_SCORE <= candidate["score"] < 1.0
+
+
+def test_best_rejects_sibling_drugs(index):
+    # A valid name of another substance must not resolve to the saved one it resembles
+    assert index.best("prednisone") is None
+    # It is still offered as a candidate
+    assert index.resolve("prednisone")[0]["name"] == "PREDNISOLONE"
+
+
+def test_best_rejects_ties(index):
+    assert index.best("Brand 3") is None
+
+
+def test_best_kind_filter(index):
+    assert index.best("IBUPROFEN", "brand") is None
+    assert index.best("IBUPROFEN", "substance")["name"] == "IBUPROFEN"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_rebuilds_after_writes_by_others(index, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(name_index, "time", clock)
+    assert index.best("Tylenol") is None
+    other = SQLiteStore(index.store.path)
+    other.save_category("acetaminophen", {"Tylenol": {"brand_name": "Tylenol", "substance_name": "ACETAMINOPHEN"}})
+    # The store is checked at most every check_interval seconds
+    clock.now += VERSION_CHECK_INTERVAL / 2
+    assert index.best("tylenol") is None
+    clock.now += VERSION_CHECK_INTERVAL / 2
+    assert index.best("tylenol")["categories"] == ["acetaminophen"]
+
+    # Records added to an existing category are picked up too
+    other.save_category("ibuprofen", {"Nurofen": {"brand_name": "Nurofen", "substance_name": "IBUPROFEN"}})
+    other.close()
+    clock.now += VERSION_CHECK_INTERVAL
+    assert index.best("nurofen")["synonyms"] == ["IBUPROFEN"]
+
+
+def test_own_writes_do_not_rebuild(index, monkeypatch):
+    index.check_interval = 0
+    index.best("advil")
+    index.store.save_category("ibuprofen", {"Nurofen": {"brand_name": "Nurofen", "substance_name": "IBUPROFEN"}})
+    index.add("ibuprofen", ["Nurofen"], ["IBUPROFEN"])
+    monkeypatch.setattr(index, "build", lambda: pytest.fail("rebuilt after its own write"))
+    assert index.best("nurofen")["name"] == "Nurofen"
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import functools
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from openfda_client import OpenFDAClient, OpenFDAError, RateLimiter, _retry_after_seconds
+
+
+@pytest.fixture
+def mock_openfda(monkeypatch):
+    """Route the client's requests to a handler: call with the handler, get back a new client."""
+
+    def make(handler, **kwargs):
+        monkeypatch.setattr(httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+        options = {"base_url": "http://openfda.test", "rate_per_minute": 0, "daily_quota": 0, "backoff_base": 0.001}
+        return OpenFDAClient(**{**options, **kwargs})
+
+    return make
+
+
+def test_api_key_is_sent_as_basic_auth(mock_openfda):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"results": []})
+
+    client = mock_openfda(handler, api_key="SECRETKEY123")
+    assert asyncio.run(client.get_json("/drug/label.json?search=x&limit=1")) == (200, {"results": []})
+    assert "SECRETKEY123" not in str(seen[0].url)
+    assert seen[0].headers["Authorization"] == "Basic " + base64.b64encode(b"SECRETKEY123:").decode()
+
+
+def test_api_key_is_stripped_from_cursors(mock_openfda):
+    def handler(request):
+        link = '<http://openfda.test/drug/label.json?search=x&limit=1&search_after=0%3Dabc&api_key=SECRETKEY123>; rel="next"'
+        return httpx.Response(200, json={"results": [{}], "meta": {"results": {"total": 2}}}, headers={"Link": link})
+
+    async def first_page():
+        pages = client.iter_label_pages("x", 1, cursor="http://openfda.test/drug/label.json?search=x&limit=1")
+        page = await pages.__anext__()
+        await pages.aclose()
+        return page
+
+    client = mock_openfda(handler, api_key="SECRETKEY123")
+    cursor = asyncio.run(first_page()).next_cursor
+    assert "SECRETKEY123" not in cursor and "search_after=0%3Dabc" in cursor
+
+
+def test_retry_after_seconds():
+    assert _retry_after_seconds("5") == 5.0
+    assert _retry_after_seconds("-3") == 0.0
+    assert _retry_after_seconds(None) is None
+    assert _retry_after_seconds("soon") is None
+    in_30s = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < _retry_after_seconds(in_30s) <= 30
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert _retry_after_seconds(past) == 0.0
+
+
+def test_rate_limiter_burst_then_rate():
+    async def timed_acquires(limiter, count):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        times = []
+        for _ in range(count):
+            await limiter.acquire()
+            times.append(loop.time() - start)
+        return times
+
+    # 10 requests/second with a burst of 2: two go out at once, the third waits about 0.1s
+    times = asyncio.run(timed_acquires(RateLimiter(600, 2, 0), 3))
+    assert times[1] < 0.05 and 0.08 < times[2] < 0.3
+
+
+def test_rate_limiter_block_and_daily_quota():
+    async def run():
+        limiter = RateLimiter(0, 1, 2)
+        limiter.block_for(0.1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await limiter.acquire()
+        waited = loop.time() - start
+        await limiter.acquire()
+        with pytest.raises(OpenFDAError) as error:
+            await limiter.acquire()
+        return waited, error.value.status_code, limiter.stats()["used_today"]
+
+    waited, status_code, used = asyncio.run(run())
+    assert waited >= 0.09 and status_code == 429 and used == 2
+
+
+def test_retries_server_errors_and_rate_limits(mock_openfda):
+    statuses = iter([503, 429, 200])
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, json={"ok": True}, headers={"Retry-After": "0"} if status == 429 else {})
+
+    client = mock_openfda(handler)
+    assert asyncio.run(client.get_json("/drug/label.json?search=x")) == (200, {"ok": True})
+    assert client.retries == 2
+
+
+def test_gives_up_after_max_retries(mock_openfda):
+    calls = []
+    client = mock_openfda(lambda request: calls.append(request) or httpx.Response(502), max_retries=2)
+    with pytest.raises(OpenFDAError) as error:
+        asyncio.run(client.get_json("/drug/label.json?search=x"))
+    assert error.value.status_code == 502 and len(calls) == 3
+
+
+def test_client_errors_are_not_retried(mock_openfda):
+    calls = []
+    client = mock_openfda(lambda request: calls.append(request) or httpx.Response(404, json={"error": {}}))
+    assert asyncio.run(client.get_json("/drug/label.json?search=x")) == (404, {})
+    assert len(calls) == 1
+
+
+def test_identical_requests_are_collapsed(mock_openfda):
+    calls = []
+
+    async def handler(request):
+        calls.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    async def run():
+        same = [client.get_json("/drug/label.json?search=a") for _ in range(5)]
+        return await asyncio.gather(*same, client.get_json("/drug/label.json?search=b"))
+
+    client = mock_openfda(handler)
+    results = asyncio.run(run())
+    assert all(result == (200, {"path": "/drug/label.json"}) for result in results)
+    assert len(calls) == 2 and client.collapsed == 4
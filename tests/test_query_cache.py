@@ -0,0 +1,73 @@
+import pytest
+
+import query_cache
+from query_cache import QueryCache
+
+
+class FakeClock:
+    """Stands in for the time module so expiry can be tested without sleeping."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeStore:
+    def __init__(self, clock):
+        self.clock = clock
+        self.queries = {}
+
+    def get_query(self, category, query, max_results):
+        return self.queries.get((category, query, max_results))
+
+    def put_query(self, category, query, max_results, brand_names):
+        self.queries[(category, query, max_results)] = (self.clock.time(), brand_names)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache, "time", clock)
+    return clock
+
+
+def test_memory_entry_expires(clock):
+    cache = QueryCache(ttl=2)
+    cache.put(("advil", 5), "advil", ["Advil"])
+    clock.now += 1.9
+    assert cache.get(("advil", 5), "advil") == ["Advil"]
+    clock.now += 0.2
+    assert cache.get(("advil", 5), "advil") is None
+    assert (cache.hits, cache.expirations, cache.misses) == (1, 1, 1)
+
+
+def test_disk_hit_keeps_its_age(clock):
+    store = FakeStore(clock)
+    QueryCache(ttl=2, store=store).put(("advil", 5), "advil", ["Advil"])
+
+    # A fresh cache (e.g. after a restart) promotes the disk entry into memory...
+    clock.now += 1.5
+    cache = QueryCache(ttl=2, store=store)
+    assert cache.get(("advil", 5), "advil") == ["Advil"]
+    assert cache.disk_hits == 1
+    # ...but only for what is left of its TTL, not a full TTL from the hit
+    clock.now += 0.4
+    assert cache.get(("advil", 5), "advil") == ["Advil"]
+    clock.now += 0.2
+    assert cache.get(("advil", 5), "advil") is None
+
+
+def test_lru_eviction(clock):
+    cache = QueryCache(ttl=60, maxsize=2)
+    for name in ("a", "b"):
+        cache.put((name, 5), name, [name])
+    cache.get(("a", 5), "a")
+    cache.put(("c", 5), "c", ["c"])
+    assert cache.get(("b", 5), "b") is None
+    assert cache.get(("a", 5), "a") == ["a"]
+    assert cache.evictions == 1